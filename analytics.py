@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+# Liquidity ratios: name -> (numerator, denominator)
+RATIOS = {
+    "currency_ratio": ("currency", "m1"),
+    "reserve_money_ratio": ("m0", "m2"),
+    "money_multiplier": ("m2", "m0"),
+    "deposit_ratio": ("demand_deposits", "m1"),
+}
+RATIO_LABELS = {
+    "currency_ratio": "Currency Ratio",
+    "reserve_money_ratio": "Reserve Money Ratio",
+    "money_multiplier": "Money Multiplier",
+    "deposit_ratio": "Deposit Ratio",
+}
+WINDOWS = (3, 12)
+
+# Rows of history an indicator looks back over; recomputing an appended tail
+# needs this many rows before it
+LOOKBACK = 24
+
+
+# Every indicator for every series, computed in one vectorized pass over the
+# full history (so a filtered view still sees the months before it):
+#   <series>_mom / _yoy     % change on the previous month / same month a
+#                           year earlier (NaN when that month is missing)
+#   <series>_mean_3 / _12   trailing 3 / 12 month means
+#   <series>_vol_12         12 month standard deviation of the MoM change
+#   <series>_z_12           distance from the 12 month mean in standard
+#                           deviations
+# plus the liquidity ratios. period_keys are year * 12 + month - 1 per row
+def compute_indicators(frame, period_keys):
+    values = frame.to_numpy(dtype=float)
+    rows, count = values.shape
+    suffixes = ["mom", "yoy"] + [f"mean_{window}" for window in WINDOWS] + ["vol_12", "z_12"]
+    names = [f"{name}_{suffix}" for name in frame.columns for suffix in suffixes]
+    # The result's block, filled in one indicator at a time (every series'
+    # columns of an indicator are a strided slice of it), so that only one
+    # indicator's temporaries exist at once
+    block = np.empty((rows, len(names) + len(RATIOS)))
+
+    def put(suffix, result):
+        k = suffixes.index(suffix)
+        block[:, k:len(names):len(suffixes)] = result
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mom = growth(values, period_keys, 1)
+        put("mom", mom)
+        put("vol_12", rolling_moments(mom, 12)[1])
+        del mom
+        put("yoy", growth(values, period_keys, 12))
+        put("mean_3", rolling_moments(values, 3)[0])
+        mean, std = rolling_moments(values, 12)
+        put("mean_12", mean)
+        np.subtract(values, mean, out=mean)
+        put("z_12", np.divide(mean, std, out=mean))
+        del mean, std
+        for k, (numerator, denominator) in enumerate(RATIOS.values()):
+            block[:, len(names) + k] = frame[numerator].to_numpy(dtype=float) / frame[denominator].to_numpy(dtype=float)
+    return pd.DataFrame(block, index=frame.index, columns=names + list(RATIOS), copy=False)
+
+
+# % change on the row `lag` months earlier, found by period key rather than
+# by position so that gaps in the history give NaN instead of a wrong lag
+def growth(values, period_keys, lag):
+    positions = np.searchsorted(period_keys, period_keys - lag)
+    found = positions < len(period_keys)
+    found[found] = period_keys[positions[found]] == period_keys[found] - lag
+    previous = np.full_like(values, np.nan)
+    previous[found] = values[positions[found]]
+    return (values / previous - 1) * 100
+
+
+# Rows per block of the rolling mean / standard deviation
+BLOCK_ROWS = 4096
+
+
+# Sum of each full trailing window of rows, as differences of the cumulative
+# sum (one row per window, so len(values) - window + 1 rows)
+def window_sums(values, window):
+    total = np.cumsum(np.concatenate([np.zeros((1,) + values.shape[1:]), values]), axis=0)
+    return total[window:] - total[:-window]
+
+
+# Trailing-window mean and sample standard deviation (ddof=1) from window
+# sums and sums of squares, like the rolling correlations in correlation.py,
+# so the memory needed doesn't grow with the window. A window with a missing
+# value is NaN, as are the first window - 1 rows, which have no full window.
+# The rows go in blocks, each summed less its own mean: the cumulative sums
+# then stay small enough that their differences keep a window's variance
+def rolling_moments(values, window):
+    mean = np.full_like(values, np.nan)
+    std = np.full_like(values, np.nan)
+    for start in range(window - 1, len(values), BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, len(values))
+        rows = values[start - window + 1:stop]
+        missing = np.isnan(rows)
+        present = rows.shape[0] - missing.sum(axis=0)
+        shift = np.where(missing, 0.0, rows).sum(axis=0) / np.maximum(present, 1)
+        centred = np.where(missing, 0.0, rows - shift)
+        sums = window_sums(centred, window)
+        variance = (window_sums(centred * centred, window) - sums * sums / window) / (window - 1)
+        gaps = window_sums(missing.astype(float), window) > 0
+        mean[start:stop] = np.where(gaps, np.nan, sums / window + shift)
+        std[start:stop] = np.where(gaps, np.nan, np.sqrt(np.maximum(variance, 0.0)))
+    return mean, std
+
+
+# Indicators for a frame that extends a parent's with appended rows: only
+# the new rows (with LOOKBACK rows of context) are computed
+def extend_indicators(previous, frame, period_keys):
+    start = len(previous)
+    first = max(start - LOOKBACK, 0)
+    tail = compute_indicators(frame.iloc[first:], period_keys[first:])
+    return pd.concat([previous, tail.iloc[start - first:]])
@@ -0,0 +1,231 @@
+import argparse
+import hashlib
+import io
+import json
+import math
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import analytics
+import data_store
+from filter_index import MONTH_NUMBERS, QUARTERS
+from rollups import STATS
+
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+
+
+# The selection in a request's year / quarter / month parameters (each
+# defaults to 'All', like the sidebar)
+def parse_filters(request, dataset):
+    params = request.query_params
+    year = params.get("year", "All")
+    quarter = params.get("quarter", "All")
+    month = params.get("month", "All")
+    if year != "All":
+        if not year.isdigit() or int(year) not in dataset.years:
+            raise ValueError(f"Unknown year: {year}")
+        year = int(year)
+    if quarter != "All" and quarter not in QUARTERS:
+        raise ValueError(f"Unknown quarter: {quarter}")
+    if month != "All" and month not in MONTH_NUMBERS:
+        raise ValueError(f"Unknown month: {month}")
+    return dataset.filter_key(year, quarter, month)
+
+
+# Columns named in the comma-separated `columns` parameter, or all of them
+def parse_columns(request, available):
+    names = request.query_params.get("columns")
+    if not names:
+        return list(available)
+    columns = names.split(",")
+    unknown = [name for name in columns if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    return columns
+
+
+# Frame as JSON columns ({"index": [...], "columns": {name: [...]}}, with
+# NaN as null) or as an Arrow IPC stream with ?format=arrow
+def frame_body(request, frame):
+    if request.query_params.get("format") == "arrow":
+        table = pa.Table.from_pandas(frame, preserve_index=True)
+        sink = io.BytesIO()
+        with ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue(), ARROW_TYPE
+    index = frame.index
+    if isinstance(index, pd.DatetimeIndex):
+        index = index.strftime("%Y-%m-%d")
+    body = {
+        "index": [to_json_value(v) for v in index],
+        "columns": {str(name): [to_json_value(v) for v in frame[name]] for name in frame.columns},
+    }
+    return json_bytes(body), "application/json"
+
+
+def to_json_value(value):
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def json_bytes(body):
+    return json.dumps(body, separators=(",", ":")).encode()
+
+
+# Endpoint handlers: (request, dataset) -> (body bytes, media type). They
+# run on a worker thread, since a first request may build derived data
+def series(request, dataset):
+    filters = parse_filters(request, dataset)
+    frame = dataset.view(*filters)
+    return frame_body(request, frame[parse_columns(request, frame.columns)])
+
+
+def indicators(request, dataset):
+    filters = parse_filters(request, dataset)
+    frame = dataset.indicator_view(*filters)
+    return frame_body(request, frame[parse_columns(request, frame.columns)])
+
+
+def liquidity_ratios(request, dataset):
+    filters = parse_filters(request, dataset)
+    return frame_body(request, dataset.indicator_view(*filters, columns=list(analytics.RATIOS)))
+
+
+def rollups(request, dataset):
+    filters = parse_filters(request, dataset)
+    stat = request.query_params.get("stat", "sum")
+    if stat not in STATS:
+        raise ValueError(f"Unknown stat: {stat}")
+    table = dataset.rollups.yearly(stat, *filters)
+    return frame_body(request, table[parse_columns(request, table.columns)])
+
+
+def summary(request, dataset):
+    filters = parse_filters(request, dataset)
+    table = dataset.rollups.selection(*filters)
+    return frame_body(request, table.loc[parse_columns(request, table.index)])
+
+
+def correlation(request, dataset):
+    filters = parse_filters(request, dataset)
+    columns = parse_columns(request, dataset.frame.columns)
+    return frame_body(request, dataset.correlation(columns, *filters))
+
+
+# Correlations and best-fit line of one pair of series
+def pair(request, dataset):
+    filters = parse_filters(request, dataset)
+    params = request.query_params
+    x, y = params.get("x", "m0"), params.get("y", "m2")
+    for name in (x, y):
+        if name not in dataset.frame.columns:
+            raise ValueError(f"Unknown column: {name}")
+    stats = dataset.pair_stats
+    slope, intercept = stats.fit_for(filters, x, y)
+    rolling = stats.rolling_for(filters, x, y).dropna()
+    body = {
+        "x": x,
+        "y": y,
+        "pearson": stats.pearson_for(filters, x, y),
+        "spearman": stats.spearman_for(filters, x, y),
+        "latest_rolling": rolling.iloc[-1] if len(rolling) else None,
+        "rolling_window": stats.window,
+        "slope": slope,
+        "intercept": intercept,
+    }
+    return json_bytes({k: to_json_value(v) for k, v in body.items()}), "application/json"
+
+
+def kpis(request, dataset):
+    filters = parse_filters(request, dataset)
+    body = {name: {"value": to_json_value(value), "date": to_json_value(date)}
+            for name, (value, date) in dataset.kpis(*filters).items()}
+    return json_bytes(body), "application/json"
+
+
+def version(request, dataset):
+    body = {
+        "version": dataset.version,
+        "parent_version": dataset.parent_version,
+        "rows": len(dataset.frame),
+        "first": to_json_value(dataset.frame.index[0]) if len(dataset.frame) else None,
+        "last": to_json_value(dataset.frame.index[-1]) if len(dataset.frame) else None,
+        "columns": list(dataset.frame.columns),
+    }
+    return json_bytes(body), "application/json"
+
+
+HANDLERS = {
+    "/series": series,
+    "/indicators": indicators,
+    "/liquidity-ratios": liquidity_ratios,
+    "/rollups": rollups,
+    "/summary": summary,
+    "/correlation": correlation,
+    "/pair": pair,
+    "/kpis": kpis,
+    "/version": version,
+}
+
+
+# ETag for a response: the dataset version and the request's normalized
+# query, so a client's copy stays valid until the store changes
+def etag_for(dataset, request):
+    query = sorted(request.query_params.multi_items())
+    digest = hashlib.sha1(repr((dataset.version, request.url.path, query)).encode()).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def endpoint(handler, shared):
+    async def respond(request):
+        dataset = shared.current()
+        etag = etag_for(dataset, request)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        try:
+            body, media_type = await run_in_threadpool(handler, request, dataset)
+        except (KeyError, ValueError) as exc:
+            return JSONResponse({"error": str(exc).strip("'\"")}, status_code=400)
+        return Response(body, media_type=media_type, headers=headers)
+    return respond
+
+
+def create_app(path=None):
+    shared = data_store.SharedDataset(path or data_store.ensure_store())
+    routes = [Route(route, endpoint(handler, shared)) for route, handler in HANDLERS.items()]
+    return Starlette(routes=routes)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the monetary aggregates as a JSON/Arrow API")
+    parser.add_argument("--store", default=None, help="Arrow store (default: built from the CSV)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--keep-alive", type=int, default=30,
+                        help="seconds an idle keep-alive connection stays open")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Worker processes import the app themselves, each with its own dataset
+        uvicorn.run("api:create_app", factory=True, host=args.host, port=args.port,
+                    workers=args.workers, timeout_keep_alive=args.keep_alive)
+    else:
+        uvicorn.run(create_app(args.store), host=args.host, port=args.port,
+                    timeout_keep_alive=args.keep_alive)
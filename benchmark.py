@@ -0,0 +1,314 @@
+import argparse
+import ast
+import functools
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import data_store
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DASHBOARD = os.path.join(BASE_DIR, "dashboard.py")
+BENCH_DIR = os.path.join(BASE_DIR, "store", "bench")
+TIMEOUT = 600
+TABS = [
+    "Money Supply Overview",
+    "Credit Availability Trends",
+    "Economic Liquidity Indicators",
+    "Relationship Explorer",
+    "Key Insights & Highlights",
+]
+
+
+# A dataset `scale` times the size of the real one: the same date range and
+# series, with the rows spread evenly over it (so every year and month
+# filter still matches) and values interpolated from the real series with a
+# little noise
+def synthetic_frame(frame, scale, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = len(frame) * scale
+    start, end = frame.index[0], frame.index[-1] + pd.offsets.MonthBegin(1)
+    dates = pd.date_range(start, end, periods=rows + 1)[:-1].astype("datetime64[ns]").rename("Date")
+    x = frame.index.asi8
+    columns = {}
+    for name in frame.columns:
+        values = frame[name].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        series = np.interp(dates.asi8, x[valid], values[valid])
+        series *= rng.normal(1.0, 0.01, rows)
+        if frame[name].dtype.kind == "i":
+            series = series.round().astype(frame[name].dtype)
+        columns[name] = series
+    return pd.DataFrame(columns, index=dates)
+
+
+# Store for a scale (1 is the real store), written on first use
+def synthetic_store(scale):
+    if scale == 1:
+        return data_store.ensure_store()
+    path = os.path.join(BENCH_DIR, f"monetary-x{scale}.arrow")
+    if not os.path.exists(path):
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        frame = data_store.Dataset.open(data_store.ensure_store()).frame
+        data_store.write_store(synthetic_frame(frame, scale), path, f"synthetic x{scale}")
+    return path
+
+
+def session():
+    from streamlit.testing.v1 import AppTest
+    return AppTest.from_file(DASHBOARD, default_timeout=TIMEOUT)
+
+
+# Seconds for one rerun of a session (after an optional widget change).
+# AppTest doesn't send the open tab back with a widget change, so it is set
+# again first (a tab change then overrides it). An exception in the script
+# is raised
+def timed_run(at, change=None):
+    start = time.perf_counter()
+    if "active_tab" in at.session_state:
+        at.session_state["active_tab"] = at.session_state["active_tab"]
+    if change is not None:
+        change(at)
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return elapsed
+
+
+# A selectbox change, made through the widget's session state key (which
+# works even when an error stopped the last run before the widget)
+def select(key, value):
+    def change(at):
+        at.session_state[key] = value
+    return change
+
+
+# Streamlit version whose AppTest internals timed_fragment_run() relies on
+# (pinned in requirements-bench.txt)
+FRAGMENT_STREAMLIT = "1.65.0"
+
+
+def fragment_runs_supported():
+    import streamlit
+    return streamlit.__version__ == FRAGMENT_STREAMLIT
+
+
+# Seconds for a rerun of only the fragment registered under key (after an
+# optional widget change), as the browser asks for when a widget inside
+# the fragment changes. AppTest has no API for it, so this uses private
+# internals (its fragment storage, and the RerunData its script runner
+# sends, given the fragment's id) of FRAGMENT_STREAMLIT only
+def timed_fragment_run(at, key, change=None):
+    import streamlit.testing.v1.local_script_runner as runner
+
+    fragment_id = at._fragment_storage.resolve_target(key)[0]
+    rerun_data = runner.RerunData
+    runner.RerunData = functools.partial(rerun_data, fragment_id=fragment_id)
+    try:
+        return timed_run(at, change)
+    finally:
+        runner.RerunData = rerun_data
+
+
+def open_tab(label):
+    def change(at):
+        at.session_state["active_tab"] = label
+    return change
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+# Every measurement for the store the process was started with
+# (DASHBOARD_STORE): cold start, a second session's first render, the first
+# visit of each tab, the filter and variable selects (the variables also as
+# explorer fragment reruns), and reruns of `sessions` concurrent sessions
+# picking random filters. A rerun where the script raised fails the run
+def run_scale(sessions, reruns, seed=0):
+    dataset = data_store.Dataset.open(data_store.STORE_PATH)
+    results = {"rows": len(dataset.frame)}
+
+    at = session()
+    results["cold_start"] = timed_run(at)
+    results["first_render"] = timed_run(session())
+
+    tabs = {}
+    for label in TABS[1:] + TABS[:1]:
+        tabs[label] = timed_run(at, open_tab(label))
+    results["tabs"] = tabs
+
+    year = dataset.years[len(dataset.years) // 2]
+    interactions = {}
+    for name, value in [("year", year), ("quarter", "Q2"), ("month", "May")]:
+        interactions[name] = timed_run(at, select(f"{name}_filter", value))
+    for name in ("month", "quarter", "year"):
+        timed_run(at, select(f"{name}_filter", "All"))
+    timed_run(at, open_tab("Relationship Explorer"))
+    interactions["x_variable"] = timed_run(at, select("x_variable", "nfa"))
+    interactions["y_variable"] = timed_run(at, select("y_variable", "domestic_credit"))
+    # The same changes as reruns of the explorer fragment alone
+    explorer = "relationship-explorer"
+    notes = []
+    if fragment_runs_supported():
+        interactions["x_variable (fragment)"] = timed_fragment_run(at, explorer, select("x_variable", "m0"))
+        interactions["y_variable (fragment)"] = timed_fragment_run(at, explorer, select("y_variable", "m2"))
+    else:
+        import streamlit
+        notes.append(f"fragment reruns not timed: they need Streamlit {FRAGMENT_STREAMLIT}, "
+                     f"found {streamlit.__version__}; see requirements-bench.txt")
+    results["interactions"] = interactions
+    results["notes"] = notes
+
+    latencies = []
+    lock = threading.Lock()
+    errors = []
+
+    def user(number):
+        rng = random.Random(seed + number)
+        try:
+            app = session()
+            app.run()
+            for _ in range(reruns):
+                if rng.random() < 0.2:
+                    change = open_tab(rng.choice(TABS))
+                else:
+                    key, options = rng.choice([
+                        ("year_filter", ["All"] + dataset.years),
+                        ("quarter_filter", ["All", "Q1", "Q2", "Q3", "Q4"]),
+                        ("month_filter", ["All"] + dataset.month_names),
+                    ])
+                    change = select(key, rng.choice(options))
+                elapsed = timed_run(app, change)
+                with lock:
+                    latencies.append(elapsed)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    results["sessions"] = {
+        "count": sessions,
+        "reruns": len(latencies),
+        "wall": time.perf_counter() - start,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+    }
+    # ru_maxrss is in KiB on Linux
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+# Run each scale in a fresh process (so cold start and peak RSS are its own)
+def benchmark(scales, sessions, reruns):
+    report = {}
+    for scale in scales:
+        env = dict(os.environ, DASHBOARD_STORE=synthetic_store(scale))
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", "--sessions", str(sessions), "--reruns", str(reruns)],
+            env=env, capture_output=True, text=True, cwd=BASE_DIR,
+        )
+        if out.returncode != 0:
+            raise RuntimeError(f"x{scale} failed:\n{out.stderr[-2000:]}")
+        report[scale] = json.loads(out.stdout.strip().splitlines()[-1])
+        print_results(scale, report[scale])
+    return report
+
+
+def print_results(scale, results):
+    def row(label, seconds):
+        print(f"  {label:36s}{seconds * 1000:9.1f} ms")
+
+    print(f"x{scale} ({results['rows']:,} rows)")
+    row("cold start", results["cold_start"])
+    row("first render", results["first_render"])
+    for label, seconds in results["tabs"].items():
+        row(f"tab {label}", seconds)
+    for name, seconds in results["interactions"].items():
+        row(f"select {name}", seconds)
+    sessions = results["sessions"]
+    label = f"{sessions['count']} sessions, {sessions['reruns']} reruns"
+    row(f"{label} p50", sessions["p50"])
+    row(f"{label} p95", sessions["p95"])
+    print(f"  {'peak RSS':36s}{results['peak_rss_mb']:9.1f} MB")
+    for note in results.get("notes", []):
+        print(f"  ({note})")
+
+
+# Import time of the dashboard script's module-level imports, run on their
+# own under python -X importtime: the wall time of the fastest of `repeat`
+# fresh processes, and that run's slowest top-level imports (cumulative)
+def import_times(repeat=5, top=12):
+    with open(DASHBOARD, encoding="utf-8") as f:
+        source = f.read()
+    code = "\n".join(ast.get_source_segment(source, node) for node in ast.parse(source).body
+                     if isinstance(node, (ast.Import, ast.ImportFrom)))
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                             capture_output=True, text=True, cwd=BASE_DIR)
+        wall = time.perf_counter() - start
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr[-2000:])
+        if best is None or wall < best[0]:
+            best = (wall, out.stderr)
+
+    wall, log = best
+    modules = {}
+    for line in log.splitlines():
+        # "import time: self [us] | cumulative | imported package", nested
+        # imports indented under the module importing them
+        fields = line.split("|")
+        if line.startswith("import time:") and len(fields) == 3 and fields[1].strip().isdigit():
+            name = fields[2]
+            if not name.startswith("  "):
+                modules[name.strip()] = int(fields[1]) / 1e6
+    slowest = sorted(modules.items(), key=lambda item: -item[1])[:top]
+    return {"wall": wall, "modules": dict(slowest)}
+
+
+def print_import_times(results):
+    print(f"imports ({results['wall'] * 1000:.1f} ms wall, slowest top-level modules):")
+    for name, seconds in results["modules"].items():
+        print(f"  {name:36s}{seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dashboard reruns headlessly with AppTest")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100, 1000],
+                        help="dataset sizes as multiples of the real one")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions")
+    parser.add_argument("--reruns", type=int, default=10, help="reruns per concurrent session")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--imports", action="store_true",
+                        help="only measure the import time of the dashboard's modules")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scale(args.sessions, args.reruns)))
+    else:
+        if args.imports:
+            report = {"imports": import_times()}
+            print_import_times(report["imports"])
+        else:
+            report = benchmark(args.scales, args.sessions, args.reruns)
+        if args.output:
+            with open(args.output, "w") as out:
+                json.dump(report, out, indent=2)
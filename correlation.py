@@ -0,0 +1,316 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from filter_index import MONTH_NUMBERS, QUARTERS
+
+
+# Pearson correlation matrix of every column pair, computed with a couple of
+# matrix products instead of one pass per pair. Like DataFrame.corr(), pairs
+# only use the rows where both values are present.
+def correlation_matrix(df):
+    values = np.asarray(df, dtype=float)
+    valid = ~np.isnan(values)
+
+    # Centre on the column means first; it keeps the sums of squares small
+    # enough that the one-pass formulas below don't lose precision
+    with np.errstate(invalid="ignore", divide="ignore"):
+        present = valid.sum(axis=0)
+        centred = values - np.where(valid, values, 0.0).sum(axis=0) / np.maximum(present, 1)
+
+    if len(values) < 2:
+        # Like DataFrame.corr(), no correlations without two rows
+        corr = np.full((values.shape[1], values.shape[1]), np.nan)
+    elif valid.all():
+        norms = np.sqrt((centred ** 2).sum(axis=0))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scaled = centred / norms
+        corr = scaled.T @ scaled
+    else:
+        mask = valid.astype(float)
+        filled = np.where(valid, centred, 0.0)
+        # Per pair (i, j): observation count and the sums over shared rows
+        n = mask.T @ mask
+        sum_x = filled.T @ mask
+        sum_y = sum_x.T
+        sum_xx = (filled ** 2).T @ mask
+        sum_yy = sum_xx.T
+        sum_xy = filled.T @ filled
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = sum_xy - sum_x * sum_y / n
+            var_x = sum_xx - sum_x ** 2 / n
+            var_y = sum_yy - sum_y ** 2 / n
+            corr = cov / np.sqrt(var_x * var_y)
+        corr[n < 2] = np.nan
+
+    corr = np.clip(corr, -1.0, 1.0)
+    return pd.DataFrame(corr, index=df.columns, columns=df.columns)
+
+
+# Pairwise statistics for every column pair and every filter partition
+# (year / quarter / month selection), so the Relationship Explorer only does
+# lookups. Pearson r, slope and intercept come from per-(year, month)
+# sufficient statistics that are summed into each partition with a single
+# matrix product. Spearman and rolling correlations are computed for all
+# pairs of a partition (or one pair's full history) on first use and kept.
+# Given the stats of a parent dataset that this frame extends with appended
+# rows, only the new cells and the partitions they reach are computed.
+class PairStats:
+    def __init__(self, frame, filter_index, window=12, parent=None, values=None):
+        self.columns = list(frame.columns)
+        self.positions = {name: i for i, name in enumerate(self.columns)}
+        self.filter_index = filter_index
+        self.window = window
+        self.dates = frame.index
+        # values: the frame as a float matrix, if the caller already has one
+        self.values = frame.to_numpy(dtype=float) if values is None else values
+        self._lock = threading.Lock()
+        start = 0 if parent is None else len(parent.values)
+
+        # Values are centred before summing; an extension keeps its parent's
+        # shift so the parent's cells can be reused as they are
+        if parent is None:
+            with np.errstate(invalid="ignore"):
+                self.shift = np.nanmean(self.values, axis=0)
+        else:
+            self.shift = parent.shift
+        self.cell_keys, self.cells = self._cells(start, parent)
+
+        keys = filter_index.selections()
+        self.partitions = {key: p for p, key in enumerate(keys)}
+        size = len(self.columns)
+        self.pearson = np.empty((len(keys), size, size))
+        self.slope = np.empty_like(self.pearson)
+        self.intercept = np.empty_like(self.pearson)
+        stale = [key for key in keys if parent is None or key not in parent.partitions
+                 or filter_index.reaches(start, *key)]
+
+        if parent is not None:
+            stale_keys = set(stale)
+            kept = [key for key in keys if key not in stale_keys]
+            rows = [self.partitions[key] for key in kept]
+            parent_rows = [parent.partitions[key] for key in kept]
+            self.pearson[rows] = parent.pearson[parent_rows]
+            self.slope[rows] = parent.slope[parent_rows]
+            self.intercept[rows] = parent.intercept[parent_rows]
+            with parent._lock:
+                spearman = dict(parent._spearman)
+                rolling = dict(parent._rolling)
+            self._spearman = {key: matrix for key, matrix in spearman.items()
+                              if key not in stale_keys}
+            self._rolling = {pair: self._extend_rolling(series, start, *pair)
+                             for pair, series in rolling.items()}
+        else:
+            self._spearman = {}
+            self._rolling = {}
+
+        n, sum_x, sum_xx, sum_xy = (self._membership(stale) @ self.cells).reshape(4, -1, size, size)
+        sum_y = sum_x.transpose(0, 2, 1)
+        sum_yy = sum_xx.transpose(0, 2, 1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = sum_xy - sum_x * sum_y / n
+            var_x = sum_xx - sum_x ** 2 / n
+            var_y = sum_yy - sum_y ** 2 / n
+            pearson = np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0)
+            # Least-squares fit of column j (y) on column i (x)
+            slope = cov / var_x
+            mean_x = sum_x / n + self.shift[:, None]
+            mean_y = sum_y / n + self.shift[None, :]
+            intercept = mean_y - slope * mean_x
+        too_few = n < 2
+        for matrix in (pearson, slope, intercept):
+            matrix[too_few] = np.nan
+        rows = [self.partitions[key] for key in stale]
+        self.pearson[rows] = pearson
+        self.slope[rows] = slope
+        self.intercept[rows] = intercept
+
+    # Per (year, month) cell and pair (i, j): shared rows, sum of x_i, sum of
+    # x_i^2 and sum of x_i * x_j over the rows where both are present. Only
+    # rows from start on are summed; earlier cells come from the parent
+    def _cells(self, start, parent):
+        values = self.values[start:]
+        keys = self.filter_index.period_keys[start:]
+        if parent is not None and not len(values):
+            return parent.cell_keys, parent.cells
+
+        valid = ~np.isnan(values)
+        mask = valid.astype(float)
+        centred = np.where(valid, values - self.shift, 0.0)
+
+        # Rows of a cell are contiguous in the date-sorted frame. Each cell's
+        # sums are Gram matrices of its block of rows, so memory grows with
+        # cells x columns^2 rather than rows x columns^2
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        size = values.shape[1]
+        cells = np.empty((4, len(starts), size, size))
+        for c, (lo, hi) in enumerate(zip(starts, np.r_[starts[1:], len(values)])):
+            m, x = mask[lo:hi], centred[lo:hi]
+            cells[0, c] = m.T @ m
+            cells[1, c] = x.T @ m
+            cells[2, c] = (x * x).T @ m
+            cells[3, c] = x.T @ x
+        cells = cells.reshape(4, len(starts), -1)
+        cell_keys = keys[starts]
+        if parent is None:
+            return cell_keys, cells
+
+        parent_keys, parent_cells = parent.cell_keys, parent.cells
+        if parent_keys[-1] == cell_keys[0]:
+            # The new rows continue the parent's last month
+            cells[:, 0] += parent_cells[:, -1]
+            parent_keys, parent_cells = parent_keys[:-1], parent_cells[:, :-1]
+        return np.r_[parent_keys, cell_keys], np.concatenate([parent_cells, cells], axis=1)
+
+    # Which cells each of the given selections covers
+    def _membership(self, keys):
+        cell_years = self.cell_keys // 12
+        cell_months = self.cell_keys % 12 + 1
+        cell_quarters = (cell_months - 1) // 3 + 1
+        rows = []
+        for year, quarter, month in keys:
+            member = np.ones(len(self.cell_keys), dtype=bool)
+            if year != 'All':
+                member &= cell_years == year
+            if quarter != 'All':
+                member &= cell_quarters == QUARTERS[quarter]
+            if month != 'All':
+                member &= cell_months == MONTH_NUMBERS[month]
+            rows.append(member)
+        return np.array(rows, dtype=float).reshape(len(keys), len(self.cell_keys))
+
+    def _pair(self, x_variable, y_variable):
+        return self.positions[x_variable], self.positions[y_variable]
+
+    def pearson_for(self, key, x_variable, y_variable):
+        if key not in self.partitions:
+            return np.nan
+        i, j = self._pair(x_variable, y_variable)
+        return self.pearson[self.partitions[key], i, j]
+
+    # (slope, intercept) of the best-fit line of y on x
+    def fit_for(self, key, x_variable, y_variable):
+        if key not in self.partitions:
+            return np.nan, np.nan
+        i, j = self._pair(x_variable, y_variable)
+        p = self.partitions[key]
+        return self.slope[p, i, j], self.intercept[p, i, j]
+
+    def spearman_for(self, key, x_variable, y_variable):
+        with self._lock:
+            matrix = self._spearman.get(key)
+        if matrix is None:
+            rows = self.filter_index.resolve(*key)
+            ranks = pd.DataFrame(self.values[rows]).rank()
+            matrix = correlation_matrix(ranks).to_numpy()
+            with self._lock:
+                self._spearman[key] = matrix
+        i, j = self._pair(x_variable, y_variable)
+        return matrix[i, j]
+
+    # Trailing-window correlation over the full history (so a filtered view
+    # still sees the preceding periods), returned for the rows of a selection
+    def rolling_for(self, key, x_variable, y_variable):
+        pair = self._pair(x_variable, y_variable)
+        with self._lock:
+            series = self._rolling.get(pair)
+        if series is None:
+            series = self._rolling_series(*pair)
+            with self._lock:
+                self._rolling[pair] = series
+        rows = self.filter_index.resolve(*key)
+        return pd.Series(series[rows], index=self.dates[rows], name="Rolling Correlation")
+
+    # Rolling correlation of rows first onwards (NaN until a window fills)
+    def _rolling_series(self, i, j, first=0):
+        x = self.values[first:, i]
+        y = self.values[first:, j]
+        valid = ~(np.isnan(x) | np.isnan(y))
+        x = np.where(valid, x - self.shift[i], 0.0)
+        y = np.where(valid, y - self.shift[j], 0.0)
+
+        def window_sum(values):
+            total = np.cumsum(np.r_[0.0, values])
+            sums = np.full(len(values), np.nan)
+            sums[self.window - 1:] = total[self.window:] - total[:-self.window]
+            return sums
+
+        n = window_sum(valid.astype(float))
+        sum_x, sum_y = window_sum(x), window_sum(y)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = window_sum(x * y) - sum_x * sum_y / n
+            var_x = window_sum(x * x) - sum_x ** 2 / n
+            var_y = window_sum(y * y) - sum_y ** 2 / n
+            corr = np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0)
+        corr[n < 2] = np.nan
+        return corr
+
+    # Trailing windows never look ahead, so appended rows only need the
+    # windows that end on them
+    def _extend_rolling(self, series, start, i, j):
+        first = max(start - self.window + 1, 0)
+        return np.r_[series[:start], self._rolling_series(i, j, first)[start - first:]]
+
+
+# Benchmark: the per-cell add_annotation heatmap vs one batched text trace.
+# The loop grows faster than quadratically, so it is only timed up to
+# loop_max variables
+def benchmark(sizes=(9, 18, 50, 100), rows=359, repeat=3, loop_max=18):
+    import plotly.graph_objects as go
+
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        df = pd.DataFrame(rng.normal(size=(rows, size)).cumsum(axis=0),
+                          columns=[f"series_{i}" for i in range(size)])
+
+        def loop():
+            corr_df = df.corr()
+            corr_z = corr_df.values
+            fig = go.Figure(data=go.Heatmap(z=corr_z, x=corr_df.columns, y=corr_df.columns))
+            for i, row in enumerate(corr_z):
+                for j, val in enumerate(row):
+                    fig.add_annotation(x=corr_df.columns[j], y=corr_df.columns[i],
+                                       text=f"{val:.2f}", showarrow=False,
+                                       font=dict(color="white" if abs(val) > 0.5 else "black"))
+            return fig
+
+        def batched():
+            corr_df = correlation_matrix(df)
+            corr_z = corr_df.values
+            labels = np.char.mod("%.2f", corr_z)
+            return go.Figure(data=go.Heatmap(z=corr_z, x=corr_df.columns, y=corr_df.columns,
+                                             text=labels, texttemplate="%{text}"))
+
+        timings = {}
+        builders = [("batched", batched)]
+        if size <= loop_max:
+            builders.append(("loop", loop))
+        for name, build in builders:
+            best = float("inf")
+            for _ in range(repeat if name == "batched" else 1):
+                start = time.perf_counter()
+                build()
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+
+        start = time.perf_counter()
+        correlation_matrix(df)
+        matrix_time = time.perf_counter() - start
+        loop_text = f"{timings['loop'] * 1000:9.1f} ms" if "loop" in timings else "  skipped   "
+        print(f"{size:4d} variables: loop {loop_text}  "
+              f"batched {timings['batched'] * 1000:7.1f} ms  "
+              f"(matrix alone {matrix_time * 1000:.2f} ms)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the correlation heatmap")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[9, 18, 50, 100])
+    parser.add_argument("--rows", type=int, default=359)
+    parser.add_argument("--loop-max", type=int, default=18,
+                        help="largest size to time the per-cell loop at")
+    args = parser.parse_args()
+    benchmark(args.sizes, args.rows, loop_max=args.loop_max)
@@ -1,12 +1,20 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import time
-from PIL import Image
+import json
+import os
+import threading
+from streamlit.runtime.scriptrunner import add_script_run_ctx
 import plotly.graph_objects as go
-import numpy as np
-import plotly.express as px
-from plotly.subplots import make_subplots
+import data_store
+import downsample
+import exports
+import figures
+import payload
+import profiling
+from analytics import RATIO_LABELS
+from data_store import LABELS
+from figure_cache import FigureCache
 
 # Page config
 st.set_page_config(
@@ -14,6 +22,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Span profiling, when on for the process or the session
+def profiling_on():
+    return profiling.ENABLED or st.query_params.get("profile") == "1"
+
 # Adding a boarder
 st.markdown("""
 <style>
@@ -50,49 +62,100 @@ div.block-container::before {
 </style>
 """, unsafe_allow_html=True)
 
-# Show loading bar only once
-def show_loading_bar():
-    loading_messages = [
-        "🔍 Analyzing data structure...",
-        "📊 Loading visual components...",
-        "🧠 Applying statistical models...",
-        "🎯 Finalizing dashboard..."
+# Query backend: "memory" (the memory-mapped store, with rollups, indicators
+# and pair statistics precomputed) or "duckdb" (SQL over a Parquet copy of
+# the store, materializing only query results)
+BACKEND = os.environ.get("DASHBOARD_BACKEND", "memory")
+
+# Load dataset (one read-only instance shared by all sessions, picking up
+# months appended to the store by an ingest)
+@st.cache_resource
+def shared_dataset():
+    if BACKEND == "duckdb":
+        import duck_store
+        return data_store.SharedDataset(data_store.ensure_store(), duck_store.open_store)
+    # Memory-mapped columnar store (built from the CSV on first run)
+    return data_store.SharedDataset(data_store.ensure_store())
+
+def main():
+    return shared_dataset().current()
+
+# Warm-up steps, run once per process on a background thread
+WARMUP_STEPS = [
+    ("🔍 Building data store...", data_store.ensure_store),
+    ("📊 Loading dataset...", main),
+]
+if BACKEND != "duckdb":
+    WARMUP_STEPS += [
+        ("📅 Building yearly rollups...", lambda: main().rollups),
+        ("📈 Computing indicators...", lambda: main().indicators),
+        ("🧮 Precomputing pair statistics...", lambda: main().pair_stats),
     ]
+
+def run_warmup(state):
+    try:
+        for i, (message, step) in enumerate(WARMUP_STEPS):
+            state["message"] = message
+            step()
+            state["done"] = i + 1
+    except Exception as exc:
+        # The script reruns the failed step itself and shows the real error
+        state["error"] = exc
+    finally:
+        state["ready"].set()
+
+@st.cache_resource
+def start_warmup():
+    state = {"message": "🚀 Starting up...", "done": 0, "error": None, "ready": threading.Event()}
+    thread = threading.Thread(target=run_warmup, args=(state,), daemon=True)
+    add_script_run_ctx(thread)
+    thread.start()
+    return state
+
+# Show loading bar only while the process is still warming up
+def show_loading_bar():
+    state = start_warmup()
+    if state["ready"].is_set():
+        return
     emoji_frames = ["⏳", "🕐", "🕓", "🕘", "⌛"]
 
-    with st.spinner("🚀 Starting up..."):
-        progress = st.progress(0, text="Starting...")
-        for i in range(100):
-            time.sleep(0.03)
-            stage = i // 25
-            message = loading_messages[min(stage, len(loading_messages)-1)]
-            emoji = emoji_frames[i % len(emoji_frames)]
-            progress.progress(i + 1, text=f"{emoji} {message} ({i+1}%)")
-        time.sleep(0.5)  # pause for effect
-
-# Use session state to avoid showing loading bar every time
-if "loaded" not in st.session_state:
-    show_loading_bar()
-    st.session_state.loaded = True
-    st.rerun() 
-
-
-# Load dataset
-@st.cache_data
-def main():
-    df = pd.read_csv("Monetary_stats_1995-2025.csv")
-    df['Date'] = pd.to_datetime(df['Date'], errors='coerce').dt.normalize()
-    df['Year'] = df['Date'].dt.year
-    df['Total'] = df["Broad Money (M2b) \n(d)            \n (3) + (4)"]
-    return df
+    placeholder = st.empty()
+    frame = 0
+    while not state["ready"].wait(0.1):
+        percent = int(100 * state["done"] / len(WARMUP_STEPS))
+        emoji = emoji_frames[frame % len(emoji_frames)]
+        placeholder.progress(percent, text=f"{emoji} {state['message']} ({percent}%)")
+        frame += 1
+    placeholder.empty()
+
+# The logo as a PNG already at its display width, made once from the
+# full-size original and kept under store/assets. Streamlit sends these bytes
+# as they are, instead of encoding, decoding and resizing the original image
+# on every rerun
+LOGO_PATH = os.path.join(data_store.BASE_DIR, 'cbsl_logo.png')
+LOGO_WIDTH = 100
+
+@st.cache_resource
+def logo_png():
+    asset = os.path.join(data_store.BASE_DIR, "store", "assets", f"cbsl_logo_{LOGO_WIDTH}.png")
+    if not os.path.exists(asset) or os.path.getmtime(asset) < os.path.getmtime(LOGO_PATH):
+        from PIL import Image
+        os.makedirs(os.path.dirname(asset), exist_ok=True)
+        with Image.open(LOGO_PATH) as image:
+            height = round(image.height * LOGO_WIDTH / image.width)
+            small = image.resize((LOGO_WIDTH, height), Image.LANCZOS)
+        tmp_path = f"{asset}.{os.getpid()}.tmp"
+        small.save(tmp_path, format="PNG", optimize=True)
+        os.replace(tmp_path, asset)
+    with open(asset, "rb") as f:
+        return f.read()
 
 # Header section (shows logo and title)
 def display_header():
-    image = Image.open('cbsl_logo.png')
     col1, col2 = st.columns([0.1, 0.9])
     with col1:
         st.markdown("<br><br>", unsafe_allow_html=True) 
-        st.image(image, width=100)
+        st.image(logo_png(), width=LOGO_WIDTH)
     with col2:
         st.markdown("""
             <style>
@@ -113,15 +176,37 @@ def display_header():
         date_str = datetime.datetime.now().strftime("%d %B %Y")
         st.write(f"Last updated by: Tharushi Seneviratne  \n {date_str}")
 
+# Browser filtering: the sidebar selects give way to range controls on the
+# charts over time, which are sent once for the full history and re-sliced
+# in the browser, so exploring dates doesn't rerun the script. On for new
+# sessions with DASHBOARD_CLIENT_FILTERS=1, and switchable in the sidebar
+CLIENT_FILTERS = os.environ.get("DASHBOARD_CLIENT_FILTERS", "0") != "0"
+
 # Sidebar filters
-def display_sidebar_filters(df):
+def display_sidebar_filters(dataset):
     st.sidebar.header("Filter Data")
     
-    # Prepare date-related columns
-    df['Date'] = pd.to_datetime(df['Date'])
-    df['Year'] = df['Date'].dt.year
-    df['Month_Name'] = df['Date'].dt.month_name()
-    df['Quarter'] = df['Date'].dt.quarter
+    if 'client_filters' not in st.session_state:
+        st.session_state.client_filters = CLIENT_FILTERS
+    client_filters = st.sidebar.toggle("Filter dates in the browser", key='client_filters')
+    if client_filters:
+        st.sidebar.caption(
+            "Pick dates with the range buttons and slider under each chart over time. "
+            "Totals, the pie, correlations and KPI cards cover the full history."
+        )
+        with profiling.span("view"):
+            filtered_df = dataset.view()
+        # Lines over a history longer than a chart's point budget are
+        # downsampled (LTTB) once for the whole history, and zooming in
+        # doesn't fetch the points in between
+        if len(filtered_df) > downsample.CHART_WIDTH_PX // 2:
+            st.sidebar.caption(
+                f"Each chart holds {downsample.CHART_WIDTH_PX // 2:,} to {downsample.CHART_WIDTH_PX:,} points sampled "
+                f"from all {len(filtered_df):,} rows, so zooming into a short range shows only "
+                "the sampled ones. For the detail of a short range, switch this off and pick "
+                "the dates in the sidebar."
+            )
+        return filtered_df, dataset.filter_key()
     
     # Initialize session state variables if they don't exist
     if 'year_filter' not in st.session_state:
@@ -134,7 +219,7 @@ def display_sidebar_filters(df):
     # Create filter widgets with session state
     year_filter = st.sidebar.selectbox(
         "Select Year", 
-        ['All'] + sorted(df['Year'].unique().tolist()),
+        ['All'] + dataset.years,
         key='year_filter'
     )
     
@@ -146,398 +231,222 @@ def display_sidebar_filters(df):
     
     month_filter = st.sidebar.selectbox(
         "Select Month", 
-        ['All'] + list(df['Month_Name'].unique()),
+        ['All'] + dataset.month_names,
         key='month_filter'
     )
     
-    # Apply filters
-    filtered_df = df.copy()
-    if year_filter != 'All':
-        filtered_df = filtered_df[filtered_df['Year'] == year_filter]
-    if quarter_filter != 'All':
-        q_map = {'Q1': 1, 'Q2': 2, 'Q3': 3, 'Q4': 4}
-        filtered_df = filtered_df[filtered_df['Quarter'] == q_map[quarter_filter]]
-    if month_filter != 'All':
-        filtered_df = filtered_df[filtered_df['Month_Name'] == month_filter]
-    
-    return filtered_df
-
-# Run the app
-df = main()
-df['Date'] = df['Date'].dt.date
-
-# Show header once, at the top
-display_header()
-
-# Tabs (rendered correctly)
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
-    "Money Supply Overview", 
-    "Credit Availability Trends", 
-    "Economic Liquidity Indicators", 
-    "Relationship Explorer", 
-    "Key Insights & Highlights"
-])
-
-# Sidebar filters applied after tab setup
-filtered_df = display_sidebar_filters(df)
+    # Apply filters (a slice or row take on the precomputed index, no copy;
+    # a query returning just the selection with the duckdb backend)
+    with profiling.span("view"):
+        filtered_df = dataset.view(year_filter, quarter_filter, month_filter)
+    return filtered_df, dataset.filter_key(year_filter, quarter_filter, month_filter)
+
+# Process-wide cache of serialized figures
+@st.cache_resource
+def figure_cache():
+    budget_mb = int(os.environ.get("DASHBOARD_FIGURE_CACHE_MB", "64"))
+    return FigureCache(max_bytes=budget_mb * 2**20)
+
+# Show a chart from the figure cache, building it from data (the view or a
+# rollup of it) on a miss. Charts over time get range controls in browser
+# filtering mode (cached apart from the plain ones)
+def show_chart(dataset, chart_id, data, filters, *args, build=None):
+    build = build or figures.CHARTS[chart_id]
+    range_controls = st.session_state.get('client_filters') and chart_id in figures.RANGE_CHARTS
+    cache_id = f"{chart_id}/range" if range_controls else chart_id
+    with profiling.span(f"chart {chart_id}") as record:
+        record["cache"] = "hit"
+
+        def build_json():
+            record["cache"] = "miss"
+            with profiling.span("build"):
+                fig = build(data, *args)
+                if range_controls:
+                    fig = figures.with_range_controls(fig, figures.RANGE_CHARTS[chart_id])
+            with profiling.span("serialize"):
+                return payload.to_json(fig)
+
+        fig_json = figure_cache().get(
+            cache_id, filters + args, dataset.version, build_json,
+            # After an append, charts of selections without new rows stay cached
+            parent_version=dataset.parent_version,
+            changed=lambda key: dataset.changed(*key[:3])
+        )
+        with profiling.span("render"):
+            # The JSON came from a validated figure, so skip validating it again
+            fig = go.Figure(json.loads(fig_json), _validate=False)
+            st.plotly_chart(fig, use_container_width=True)
+
+# Run a section as a fragment: a change to one of its widgets reruns only
+# the section, with the inputs it was given on the last full run, instead
+# of the whole script. Sections take the dataset and selection as arguments
+# rather than reading the script's globals, so a fragment rerun never pairs
+# another rerun's dataset with its filters. A fragment rerun is profiled as
+# a trace of its own (kept in the log and metrics; the sidebar panel shows
+# full reruns)
+def isolated(key):
+    def decorate(render):
+        def run(*args):
+            with profiling.fragment_span(f"fragment {key}", profiling_on()):
+                render(*args)
+        return st.fragment(run, key=key)
+    return decorate
+
+# Deferred download: the export is written (or read back from disk) only
+# when the button is clicked. Streamlit holds the bytes of a download in
+# memory to serve it, so the whole file is read here; only writing the
+# export is chunked
+def export_reader(dataset, filters, export_format):
+    def read():
+        with open(exports.export_file(dataset, filters, export_format), "rb") as f:
+            return f.read()
+    return read
 
 # DASHBOARD 1: MONEY SUPPLY OVERVIEW
-with tab1:
+def render_money_supply(dataset, filtered_df, filters):
     st.header("Overview of Money Supply Components")
     
     col1, col2 = st.columns(2)
     
     with col1:
-        # Line chart: M0, M1, M2, M3 over time
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=filtered_df["Date"], y=filtered_df["Reserve Money (M0)  (a)"], mode='lines', name='M0'))
-        fig.add_trace(go.Scatter(x=filtered_df["Date"], y=filtered_df["Narrow Money (M1) \n(c)    \n (1) + (2)"], mode='lines', name='M1'))
-        fig.add_trace(go.Scatter(x=filtered_df["Date"], y=filtered_df["Broad Money (M2) (b)"], mode='lines', name='M2'))
-        fig.add_trace(go.Scatter(x=filtered_df["Date"], y=filtered_df["Broad Money (M2b) \n(d)            \n (3) + (4)"], mode='lines', name='M2b'))
-        
-        fig.update_layout(
-            title='Money Supply Measures Over Time',
-            xaxis_title='Date',
-            yaxis_title='Rs. Mn',
-            legend_title='Money Supply Types'
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        show_chart(dataset, "money_supply_lines", filtered_df, filters)
     
     with col2:
-        # Bar chart or stacked area: Year-wise composition of money supply
-        fig2 = go.Figure()
-        fig2.add_trace(go.Bar(x=filtered_df["Date"],y=filtered_df["Reserve Money (M0)  (a)"], name='M0'))
-        fig2.add_trace(go.Bar(x=filtered_df["Date"], y=filtered_df["Narrow Money (M1) \n(c)    \n (1) + (2)"], name='M1'))
-        fig2.add_trace(go.Bar(x=filtered_df["Date"], y=filtered_df["Broad Money (M2) (b)"], name='M2'))
-        fig2.add_trace(go.Bar(x=filtered_df["Date"], y=filtered_df["Broad Money (M2b) \n(d)            \n (3) + (4)"], name='M2b'))
-        
-        fig2.update_layout(
-            title='Distribution of Money Supply Components',
-            xaxis_title='Date',
-            yaxis_title='Rs. Mn',
-            barmode='stack',
-            legend_title='Money Supply Types'
-        )
-        st.plotly_chart(fig2, use_container_width=True)
+        show_chart(dataset, "money_supply_bars", filtered_df, filters)
     
     # Add a pie chart to the dashboard
     st.subheader("Distribution of Money Supply Components (%)")
-    
-    # Summing up the latest available data for the components
-    latest_data = filtered_df.iloc[-1]  
-    money_supply = [
-        latest_data["Reserve Money (M0)  (a)"],
-        latest_data["Narrow Money (M1) \n(c)    \n (1) + (2)"],
-        latest_data["Broad Money (M2) (b)"],
-        latest_data["Broad Money (M2b) \n(d)            \n (3) + (4)"]
-    ]
-    
-    labels = ['M0','M1', 'M2', 'M2b']
-    
-    fig4 = go.Figure(data=[go.Pie(labels=labels, values=money_supply, hole=0.3)])
-    
-    fig4.update_layout(
-        title='Pie Chart of Money Supply Components',
-        legend_title='Money Supply Types'
-    )
-    st.plotly_chart(fig4, use_container_width=True)
+    show_chart(dataset, "money_supply_pie", filtered_df, filters)
     st.subheader("Yearly Summary of Money Supply Components")
     
-    # Group data by year and calculate the total sum for each component
-    yearly_summary = filtered_df.groupby(filtered_df['Date'].dt.year).agg({
-        "Reserve Money (M0)  (a)": "sum",
-        "Narrow Money (M1) \n(c)    \n (1) + (2)": "sum",
-        "Broad Money (M2) (b)": "sum",
-        "Broad Money (M2b) \n(d)            \n (3) + (4)": "sum"
-    }).reset_index()
+    # Yearly totals for each component, from the rollup cube
+    with profiling.span("rollups yearly sum"):
+        yearly_summary = dataset.rollups.yearly("sum", *filters)[["m0", "m1", "m2", "m2b"]].reset_index()
     yearly_summary.rename(columns={
-        "Date": "Year",
-        "Reserve Money (M0)  (a)": "M0",
-        "Narrow Money (M1) \n(c)    \n (1) + (2)": "M1",
-        "Broad Money (M2) (b)": "M2",
-        "Broad Money (M2b) \n(d)            \n (3) + (4)": "M2b"
+        "m0": "M0",
+        "m1": "M1",
+        "m2": "M2",
+        "m2b": "M2b"
     }, inplace=True)
     st.dataframe(yearly_summary, use_container_width=True)
     
     st.subheader("View filterd data")
     with st.expander("View Raw Data"):
-        st.write(filtered_df[["Date", "Narrow Money (M1) \n(c)    \n (1) + (2)", "Broad Money (M2) (b)", "Broad Money (M2b) \n(d)            \n (3) + (4)"]])
-        st.download_button("Download Data", filtered_df.to_csv().encode("utf-8"), "money_supply_data.csv", "text/csv")
+        st.write(filtered_df[["m1", "m2", "m2b"]].rename(columns=LABELS))
+        export_controls(dataset, filters)
+
+@isolated("export")
+def export_controls(dataset, filters):
+    if 'export_format' not in st.session_state:
+        st.session_state.export_format = "CSV"
+    export_format = st.selectbox("Export Format:", list(exports.FORMATS), key='export_format')
+    extension, mime = exports.FORMATS[export_format]
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Download Data", export_reader(dataset, filters, export_format),
+                           "money_supply_data" + extension, mime, on_click="ignore")
+    with col2:
+        # Bulk export: every series over the full history
+        st.download_button("Download All Series", export_reader(dataset, ('All', 'All', 'All'), export_format),
+                           "monetary_data_all" + extension, mime, on_click="ignore")
 
 # DASHBOARD 2: CREDIT AVAILABILITY TRENDS
-with tab2:
+def render_credit(dataset, filtered_df, filters):
     st.header("Credit Availability Trends")
     
     col1, col2 = st.columns(2)
     with col1:
-        # Dual-axis chart: M2 vs Private Sector Credit
-        fig5 = make_subplots(specs=[[{"secondary_y": True}]])
-        
-        fig5.add_trace(
-            go.Scatter(x=filtered_df["Date"], y=filtered_df["Broad Money (M2) (b)"], name="M2"),
-            secondary_y=False,
-        )
-        
-        fig5.add_trace(
-            go.Scatter(x=filtered_df["Date"], y=filtered_df["Credit granted to the Private Sector by Commercial Banks"], name="Private Sector Credit"),
-            secondary_y=True,
-        )
-        
-        fig5.update_layout(
-            title_text="M2 vs Private Sector Credit",
-            xaxis_title="Date"
-        )
-        
-        fig5.update_yaxes(title_text="M2 (Rs. Mn)", secondary_y=False)
-        fig5.update_yaxes(title_text="Private Sector Credit (Rs. Mn)", secondary_y=True)
-        
-        st.plotly_chart(fig5, use_container_width=True)
+        show_chart(dataset, "credit_vs_m2", filtered_df, filters)
     
     with col2:
-        # Line chart:credit columns
-        credit_columns = {
-            "Net Credit granted to the Government by Central Bank": "Govt Credit by Central Bank",
-            "Net Credit granted to the Government by Commercial Banks": "Govt Credit by Commercial Banks",
-            "Net Credit granted to the Government (NCG)\n(8) + (9)": "Total Govt Credit (NCG)",
-            "Credit granted to Public Corporations by Commercial Banks": "Credit to Public Corporations",
-            "Credit granted to the Private Sector by Commercial Banks": "Credit to Private Sector",
-            "Domestic Credit \n(10) + (11) + (12)": "Total Domestic Credit"
-        }
-        fig4 = go.Figure()
-        for old_col, new_col in credit_columns.items():
-            fig4.add_trace(go.Scatter(x=filtered_df["Date"], y=filtered_df[old_col], mode='lines', name=new_col))
-        fig4.update_layout(
-            title='Credit Growth Over Time',
-            xaxis_title='Date',
-            yaxis_title='Credit Amount (Rs. Mn)',
-            legend_title='Credit Types'
-        )
-        st.plotly_chart(fig4, use_container_width=True)
-    
-    # Define the credit-related columns and money supply columns with short names
-    credit_columns = {
-        "Net Credit granted to the Government by Central Bank": "Govt Credit by Central Bank",
-        "Net Credit granted to the Government by Commercial Banks": "Govt Credit by Commercial Banks",
-        "Net Credit granted to the Government (NCG)\n(8) + (9)": "Total Govt Credit (NCG)",
-        "Credit granted to Public Corporations by Commercial Banks": "Credit to Public Corporations",
-        "Credit granted to the Private Sector by Commercial Banks": "Credit to Private Sector",
-        "Domestic Credit \n(10) + (11) + (12)": "Total Domestic Credit"
-    }
-    money_supply_columns = {
-        "Narrow Money (M1) \n(c)    \n (1) + (2)": "Narrow Money (M1)",
-        "Broad Money (M2) (b)": "Broad Money (M2)",
-        "Broad Money (M2b) \n(d)            \n (3) + (4)": "Broad Money (M2b)"
-    }
-    # Merge both dictionaries
-    all_columns = {**credit_columns, **money_supply_columns}
-    # Select only the original columns (keys)
-    selected_df = filtered_df[list(all_columns.keys())]
-    # Rename the selected columns to their short names (values)
-    selected_df = selected_df.rename(columns=all_columns)
-    # Now calculate the correlation matrix
-    corr_df = selected_df.corr()
-    # Create a heatmap using go.Heatmap
-    corr_z = corr_df.values
-    fig6 = go.Figure(data=go.Heatmap(
-        z=corr_z,
-        x=corr_df.columns,
-        y=corr_df.columns,
-        colorscale='RdBu_r',
-        zmin=-1,
-        zmax=1
-    ))
-    # Add annotations (correlation values)
-    for i, row in enumerate(corr_z):
-        for j, val in enumerate(row):
-            fig6.add_annotation(
-                x=corr_df.columns[j],
-                y=corr_df.columns[i],
-                text=f"{val:.2f}",
-                showarrow=False,
-                font=dict(color="white" if abs(val) > 0.5 else "black")
-            )
-    # Update layout with title
-    fig6.update_layout(
-        title="Correlation Between Credit and Money Supply Variables"
-    )
-    # Display in Streamlit
+        show_chart(dataset, "credit_lines", filtered_df, filters)
+    
     st.subheader("Correlation Matrix: Credit Variables vs Money Supply")
-    st.plotly_chart(fig6, use_container_width=True)
-
-# DASHBOARD 3: ECONOMIC LIQUIDITY INDICATORS
-with tab3:
-
-    st.header("Economic Liquidity Indicators")
-
-    # Bubble Chart: Liquidity Measures vs Foreign Assets
-    filtered_df['Month'] = pd.to_datetime(filtered_df['Date']).dt.strftime('%B')
-
-    fig7 = px.scatter(
-        filtered_df,
-        x="Broad Money (M2b) \n(d)            \n (3) + (4)",  
-        y="Net Foreign Assets of Monetary Authorities (e)",
-        size="Net Credit granted to the Government by Central Bank",
-        color="Month",  # color by Year instead of Date
-        title="Liquidity Measures and Foreign Assets",
-        labels={
-            "Broad Money (M2b) \n(d)            \n (3) + (4)": "Broad Money (M2b) (Rs. Mn)",
-            "Net Foreign Assets of Monetary Authorities (e)": "Net Foreign Assets (Rs. Mn)",
-            "Net Credit granted to the Government by Central Bank": "Credit to Government (Rs. Mn)",
-            "Month": "Month"
-        }
+    show_chart(
+        dataset, "credit_correlation", filtered_df, filters,
+        build=lambda _: figures.correlation_heatmap(
+            dataset.correlation(list(figures.CORRELATION_COLUMNS), *filters))
     )
-    fig7.update_layout(
-        xaxis_title="Broad Money (M2b) (Rs. Mn)",
-        yaxis_title="Net Foreign Assets of Monetary Authorities (Rs. Mn)"
-    )
-    st.plotly_chart(fig7, use_container_width=True)
-
-    # Area Chart: Liquidity Ratios Over Time
-    liquidity_df = filtered_df.copy()
-
-    # Calculate Liquidity Ratios
-    liquidity_df["Currency Ratio"] = liquidity_df["Currency held by the Public"] / liquidity_df["Narrow Money (M1) \n(c)    \n (1) + (2)"]
-    liquidity_df["Reserve Money Ratio"] = liquidity_df["Reserve Money (M0)  (a)"] / liquidity_df["Broad Money (M2) (b)"]
-    liquidity_df["Money Multiplier"] = liquidity_df["Broad Money (M2) (b)"] / liquidity_df["Reserve Money (M0)  (a)"]
-    liquidity_df["Deposit Ratio"] = liquidity_df["Demand Deposits held by the Public"] / liquidity_df["Narrow Money (M1) \n(c)    \n (1) + (2)"]
-
-    # Melt the ratios into long format
-    liquidity_melted = liquidity_df.melt(
-        id_vars=["Date"],
-        value_vars=["Currency Ratio", "Reserve Money Ratio", "Money Multiplier", "Deposit Ratio"],
-        var_name="Liquidity Ratio",
-        value_name="Value"
-    )
-
-    # Plot Area Chart
-    fig8 = px.area(
-        liquidity_melted,
-        x="Date",
-        y="Value",
-        color="Liquidity Ratio",
-        title="Liquidity Ratios Over Time"
-    )
-
-    # Display the chart
-    st.plotly_chart(fig8, use_container_width=True) 
 
-# Sunburst Chart: Breakdown of Domestic and Foreign Liquidity
-    liquidity_df = filtered_df.copy()
-
-    # Step 1: Categorize data into Domestic and Foreign liquidity
-    liquidity_df['Liquidity Type'] = 'Domestic'
-    liquidity_df.loc[liquidity_df['Net Foreign Assets of Monetary Authorities (e)'] > 0, 'Liquidity Type'] = 'Foreign'
-
-    # Step 2: Create new columns for the liquidity components
-    liquidity_df['Domestic Credit'] = liquidity_df["Net Credit granted to the Government by Central Bank"] + liquidity_df["Net Credit granted to the Government by Commercial Banks"] + liquidity_df["Credit granted to Public Corporations by Commercial Banks"] + liquidity_df["Credit granted to the Private Sector by Commercial Banks"]
-    liquidity_df['Foreign Assets'] = liquidity_df["Net Foreign Assets of Monetary Authorities (e)"] + liquidity_df["Net Foreign Assets of Commercial Banks "]
+# DASHBOARD 3: ECONOMIC LIQUIDITY INDICATORS
+BREAKDOWN_VIEWS = ["Sunburst", "Treemap", "Icicle"]
 
-    # Step 3: Create a Sunburst chart structure
-    sunburst_df = liquidity_df[['Liquidity Type', 'Domestic Credit', 'Foreign Assets']]
+def render_liquidity(dataset, filtered_df, filters):
 
-    # Reshape the DataFrame for Sunburst chart
-    sunburst_df_melted = sunburst_df.melt(id_vars=['Liquidity Type'], value_vars=['Domestic Credit', 'Foreign Assets'], var_name='Liquidity Component', value_name='Amount')
+    st.header("Economic Liquidity Indicators")
 
-    # Step 4: Plot the Sunburst chart
-    fig = px.sunburst(
-        sunburst_df_melted, 
-        path=['Liquidity Type', 'Liquidity Component'],  # Hierarchy: Domestic/Foreign -> Credit/Assets
-        values='Amount',  # Values to visualize (amounts)
-        title="Breakdown of Domestic and Foreign Liquidity"
-    )
+    show_chart(dataset, "liquidity_bubble", filtered_df, filters)
+    with profiling.span("indicators"):
+        ratios = dataset.indicator_view(*filters, columns=list(RATIO_LABELS))
+    show_chart(dataset, "liquidity_ratios", ratios, filters)
+    liquidity_breakdown(dataset, filtered_df, filters)
 
-    # Display the Sunburst chart
-    st.plotly_chart(fig, use_container_width=True)
+# Same pre-aggregated hierarchy in each view
+@isolated("liquidity-breakdown")
+def liquidity_breakdown(dataset, filtered_df, filters):
+    if 'breakdown_view' not in st.session_state:
+        st.session_state.breakdown_view = BREAKDOWN_VIEWS[0]
+    breakdown_view = st.radio("Breakdown View:", BREAKDOWN_VIEWS, horizontal=True, key='breakdown_view')
+    show_chart(dataset, f"liquidity_{breakdown_view.lower()}", filtered_df, filters)
     
 # DASHBOARD 4: RELATIONSHIP EXPLORER
-with tab4:
+CORRELATION_MODES = ["Pearson", "Spearman", "Rolling"]
+
+def render_relationships(dataset, filtered_df, filters):
     st.header("Relationship Explorer")
-    
+    relationship_explorer(dataset, filtered_df, filters)
+
+# Variable and mode selects with the charts and statistics they drive
+@isolated("relationship-explorer")
+def relationship_explorer(dataset, filtered_df, filters):
     # Variables for selection
-    available_variables = [
-        "Reserve Money (M0)  (a)", 
-        "Broad Money (M2) (b)", 
-        "Currency held by the Public",
-        "Demand Deposits held by the Public",
-        "Narrow Money (M1) \n(c)    \n (1) + (2)",
-        "Time and Savings Deposits held by the Public",
-        "Broad Money (M2b) \n(d)            \n (3) + (4)",
-        "Net Foreign Assets of Monetary Authorities (e)",
-        "Net Foreign Assets of Commercial Banks ",
-        "Net Foreign Assets (NFA) \n(5) + (6)",
-        "Net Credit granted to the Government by Central Bank",
-        "Net Credit granted to the Government by Commercial Banks",
-        "Net Credit granted to the Government (NCG)\n(8) + (9)",
-        "Credit granted to Public Corporations by Commercial Banks",
-        "Credit granted to the Private Sector by Commercial Banks",
-        "Domestic Credit \n(10) + (11) + (12)",
-        "Net Domestic Assets  (NDA)       \n (13) + (14)",
-        "Broad Money (M2b)\n (7) + (15)"
-    ]
+    available_variables = figures.AVAILABLE_VARIABLES
+    
+    # Initialize session state variables if they don't exist
+    if 'x_variable' not in st.session_state:
+        st.session_state.x_variable = available_variables[0]
+    if 'y_variable' not in st.session_state:
+        st.session_state.y_variable = available_variables[1]
     
     col1, col2 = st.columns(2)
     
     with col1:
-        x_variable = st.selectbox("Select X-Axis Variable:", available_variables, index=0)
+        x_variable = st.selectbox("Select X-Axis Variable:", available_variables, format_func=LABELS.get, key='x_variable')
     
     with col2:
-        y_variable = st.selectbox("Select Y-Axis Variable:", available_variables, index=1)
-    
-    # Generate scatter plot without trendline (to avoid statsmodels dependency)
-    fig10 = go.Figure()
-    
-    fig10.add_trace(go.Scatter(
-        x=filtered_df[x_variable],
-        y=filtered_df[y_variable],
-        mode='markers',
-        marker=dict(
-            size=8,
-            color='blue',
-            opacity=0.7
-        ),
-        name='Data Points'
-    ))
-    
-    # Manual calculation of best-fit line using numpy
-    if len(filtered_df) > 1:  # Only calculate if we have enough data points
-        x_values = filtered_df[x_variable].values
-        y_values = filtered_df[y_variable].values
-        
-        # Filter out NaN values
-        mask = ~np.isnan(x_values) & ~np.isnan(y_values)
-        x_filtered = x_values[mask]
-        y_filtered = y_values[mask]
-        
-        if len(x_filtered) > 1:  # Ensure we still have enough points after filtering
-            # Calculate best fit line
-            slope, intercept = np.polyfit(x_filtered, y_filtered, 1)
-            
-            # Create x points for the line
-            x_line = np.array([min(x_filtered), max(x_filtered)])
-            y_line = slope * x_line + intercept
-            
-            # Add the trendline to plot
-            fig10.add_trace(go.Scatter(
-                x=x_line,
-                y=y_line,
-                mode='lines',
-                line=dict(color='red', dash='dash'),
-                name=f'Trend Line (y = {slope:.4f}x + {intercept:.4f})'
-            ))
-    
-    fig10.update_layout(
-        title=f"Relationship Between {x_variable} and {y_variable}",
-        xaxis_title=x_variable,
-        yaxis_title=y_variable
-    )
-    
-    st.plotly_chart(fig10, use_container_width=True)
-    
-    # Calculate correlation
-    correlation = filtered_df[x_variable].corr(filtered_df[y_variable])
+        y_variable = st.selectbox("Select Y-Axis Variable:", available_variables, format_func=LABELS.get, key='y_variable')
+    
+    if 'correlation_mode' not in st.session_state:
+        st.session_state.correlation_mode = CORRELATION_MODES[0]
+    correlation_mode = st.radio("Correlation Mode:", CORRELATION_MODES, horizontal=True, key='correlation_mode')
+    
+    # Best-fit line and correlations are lookups in the precomputed pair statistics
+    pair_stats = dataset.pair_stats
+    with profiling.span("pair stats fit"):
+        fit = tuple(float(v) for v in pair_stats.fit_for(filters, x_variable, y_variable))
+    show_chart(dataset, "relationship", filtered_df, filters, x_variable, y_variable, fit)
+    
+    if correlation_mode == "Spearman":
+        label = "Spearman Correlation"
+        with profiling.span("pair stats spearman"):
+            correlation = pair_stats.spearman_for(filters, x_variable, y_variable)
+    elif correlation_mode == "Rolling":
+        label = "Latest Rolling Correlation"
+        with profiling.span("pair stats rolling"):
+            rolling = pair_stats.rolling_for(filters, x_variable, y_variable)
+        show_chart(
+            dataset, "rolling_correlation", filtered_df, filters, x_variable, y_variable,
+            build=lambda _, x, y: figures.rolling_correlation(rolling, x, y, pair_stats.window)
+        )
+        rolling = rolling.dropna()
+        correlation = rolling.iloc[-1] if len(rolling) else float("nan")
+    else:
+        label = "Correlation Coefficient"
+        with profiling.span("pair stats pearson"):
+            correlation = pair_stats.pearson_for(filters, x_variable, y_variable)
     
     st.metric(
-        label="Correlation Coefficient", 
+        label=label, 
         value=f"{correlation:.4f}",
         delta=None
     )
@@ -556,37 +465,32 @@ with tab4:
         st.write("There is a strong negative correlation between the selected variables.")
 
 # DASHBOARD 5: KEY INSIGHTS & HIGHLIGHTS
-with tab5:
-    st.header("Key Insights & Highlights")
-    
-    # KPI cards
+# KPI cards of a selection with rows
+def show_kpi_cards(dataset, filters):
+    with profiling.span("kpis"):
+        kpis = dataset.kpis(*filters)
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        # Check if 'M2_Growth' exists, otherwise calculate it
-        if 'M2_Growth' not in filtered_df.columns:
-            # Assuming 'M2_Growth' is the growth rate from previous year, calculate it
-            filtered_df['M2_Growth'] = filtered_df['Broad Money (M2) (b)'].pct_change() * 100
-        
-        # Peak M2 growth
-        max_m2_growth = filtered_df['M2_Growth'].max()
+        # Peak M2 growth on the same month a year earlier
+        max_m2_growth, max_m2_growth_date = kpis["peak_m2_growth"]
         # Handle potential NaN values
         if pd.isna(max_m2_growth):
             max_m2_growth = 0
             max_m2_growth_date = "N/A"
         else:
-            max_m2_growth_date = filtered_df.loc[filtered_df['M2_Growth'].idxmax(), 'Date'].strftime('%b %Y') if not pd.isna(filtered_df['M2_Growth'].idxmax()) else "N/A"
+            max_m2_growth_date = max_m2_growth_date.strftime('%b %Y')
         
         st.metric(
-            label="Peak M2 Growth", 
+            label="Peak M2 Growth (YoY)", 
             value=f"{max_m2_growth:.3f}%",
             delta=f"in {max_m2_growth_date}"
         )
     
     with col2:
         # Max M1 value
-        max_m1 = filtered_df["Narrow Money (M1) \n(c)    \n (1) + (2)"].max()
-        max_m1_date = filtered_df.loc[filtered_df["Narrow Money (M1) \n(c)    \n (1) + (2)"].idxmax(), 'Date'].strftime('%b %Y') if not pd.isna(filtered_df["Narrow Money (M1) \n(c)    \n (1) + (2)"].idxmax()) else "N/A"
+        max_m1, max_m1_date = kpis["max_m1"]
+        max_m1_date = max_m1_date.strftime('%b %Y') if max_m1_date is not None else "N/A"
         
         st.metric(
             label="Maximum M1 Value", 
@@ -596,14 +500,24 @@ with tab5:
     
     with col3:
         # Max Reserve Money (M0) value
-        max_m0 = filtered_df["Reserve Money (M0)  (a)"].max()
-        max_m0_date = filtered_df.loc[filtered_df["Reserve Money (M0)  (a)"].idxmax(), 'Date'].strftime('%b %Y') if not pd.isna(filtered_df["Reserve Money (M0)  (a)"].idxmax()) else "N/A"
+        max_m0, max_m0_date = kpis["max_m0"]
+        max_m0_date = max_m0_date.strftime('%b %Y') if max_m0_date is not None else "N/A"
         
         st.metric(
             label="Maximum M0 Value", 
             value=f"{max_m0/1000:.1f}B",  
             delta=f"in {max_m0_date}"
         )
+
+def render_insights(dataset, filtered_df, filters):
+    st.header("Key Insights & Highlights")
+    
+    # KPI cards, read from the selection's rollup and indicators (a note
+    # instead for a selection without rows)
+    if len(filtered_df) == 0:
+        st.info(f"{figures.NO_DATA}.")
+    else:
+        show_kpi_cards(dataset, filters)
     
     st.subheader("Summary Points")
     
@@ -623,45 +537,85 @@ with tab5:
     # Key trend visualization
     st.subheader("Long-Term Money Supply Trend")
     
-    # Create a simple visualization for the summary
-    fig11 = go.Figure()
-    
-    # Use annual averages for cleaner visualization
-    filtered_df['Year'] = filtered_df['Date'].dt.year  # Ensure Year is available for grouping
-    annual_avg = filtered_df.groupby('Year')[["Narrow Money (M1) \n(c)    \n (1) + (2)", "Broad Money (M2) (b)", "Broad Money (M2b) \n(d)            \n (3) + (4)"]].mean().reset_index()
-    
-    fig11.add_trace(go.Scatter(x=annual_avg["Year"], y=annual_avg["Narrow Money (M1) \n(c)    \n (1) + (2)"], mode='lines+markers', name='M1'))
-    fig11.add_trace(go.Scatter(x=annual_avg["Year"], y=annual_avg["Broad Money (M2) (b)"], mode='lines+markers', name='M2'))
-    fig11.add_trace(go.Scatter(x=annual_avg["Year"], y=annual_avg["Broad Money (M2b) \n(d)            \n (3) + (4)"], mode='lines+markers', name='M2b'))
-    
-    # Add annotations for major events (replace with actual years/events)
-    if 2008 in annual_avg['Year'].values:
-        fig11.add_annotation(
-            x=2008, 
-            y=annual_avg.loc[annual_avg['Year'] == 2008, "Broad Money (M2) (b)"].values[0],
-            text="2008 Crisis",
-            showarrow=True,
-            arrowhead=1
-        )
-    
-    if 2019 in annual_avg['Year'].values:
-        fig11.add_annotation(
-            x=2019, 
-            y=annual_avg.loc[annual_avg['Year'] == 2019, "Broad Money (M2) (b)"].values[0],
-            text="2019 Crisis",
-            showarrow=True,
-            arrowhead=1
-        )
-    
-    fig11.update_layout(
-        title='Long-Term Money Supply Trends (Annual Averages)',
-        xaxis_title='Year',
-        yaxis_title='Money Supply (Rs. Mn)',
-        legend_title='Money Supply Measures'
-    )
-    
-  
-    st.plotly_chart(fig11, use_container_width=True)
+    # Annual averages for cleaner visualization
+    with profiling.span("rollups yearly mean"):
+        annual_avg = dataset.rollups.yearly("mean", *filters)[["m1", "m2", "m2b"]].reset_index()
+    show_chart(dataset, "money_supply_trend", annual_avg, filters)
+
+# Profiling panel, only shown while profiling: the rerun's steps with their
+# wall time, net allocations (when the process traces them) and figure
+# cache result, and downloads of the spans (JSON lines) and process totals
+# (OpenMetrics) for monitoring
+def show_profile(trace):
+    if trace is None:
+        return
+    with st.sidebar.expander("⏱️ Profile"):
+        steps = pd.DataFrame({
+            "Step": ["\u2003" * r["depth"] + r["name"].rsplit("/", 1)[-1] for r in trace.spans],
+            "ms": [r.get("ms") for r in trace.spans],
+            "Alloc KiB": [r.get("alloc_kb") for r in trace.spans],
+            "Cache": [r.get("cache", "") for r in trace.spans],
+        })
+        total_ms = sum(r.get("ms", 0) for r in trace.spans if r["depth"] == 0)
+        st.write(f"Rerun: {total_ms:.1f} ms")
+        st.dataframe(steps, hide_index=True, use_container_width=True)
+        stats = figure_cache().stats()
+        st.write(f"Figure cache: {stats['hits']} hits, {stats['misses']} misses, "
+                 f"{stats['entries']} entries ({stats['bytes'] / 2**20:.1f} MB)")
+        st.download_button("Spans (JSON lines)", profiling.to_json_lines(trace),
+                           "spans.jsonl", "application/jsonl")
+        st.download_button("Metrics (OpenMetrics)", profiling.to_openmetrics(stats),
+                           "metrics.txt", "application/openmetrics-text; version=1.0.0")
+
+# Dashboard tabs and their sections
+TABS = [
+    ("Money Supply Overview", render_money_supply),
+    ("Credit Availability Trends", render_credit),
+    ("Economic Liquidity Indicators", render_liquidity),
+    ("Relationship Explorer", render_relationships),
+    ("Key Insights & Highlights", render_insights),
+]
+tab_labels = [label for label, _ in TABS]
+# Run the app, profiled as one trace (the warm-up bar shows before anything
+# else is rendered)
+with profiling.rerun_trace(profiling_on()) as trace:
+    with profiling.span("warm-up"):
+        show_loading_bar()
+
+    with profiling.span("main"):
+        dataset = main()
+
+    # Keep the explorer selections while its tab is closed, and the date
+    # filters while filtering in the browser (Streamlit drops the state of
+    # widgets that aren't rendered in a run)
+    for key in ('x_variable', 'y_variable', 'correlation_mode', 'export_format', 'breakdown_view',
+                'year_filter', 'quarter_filter', 'month_filter'):
+        if key in st.session_state:
+            st.session_state[key] = st.session_state[key]
+
+    # Show header once, at the top
+    with profiling.span("header"):
+        display_header()
+
+    # Tabs: with tab state tracked, only the open tab's figures are built
+    if os.environ.get("DASHBOARD_LAZY_TABS", "1") != "0":
+        tabs = st.tabs(tab_labels, key="active_tab", on_change="rerun")
+    else:
+        # Every tab renders on each rerun
+        tabs = st.tabs(tab_labels)
+
+    # Sidebar filters applied after tab setup
+    with profiling.span("sidebar filters"):
+        filtered_df, filters = display_sidebar_filters(dataset)
+
+    for tab, (label, render) in zip(tabs, TABS):
+        with tab:
+            # .open is None when tab state isn't tracked
+            if tab.open is not False:
+                with profiling.span(f"tab {label}"):
+                    render(dataset, filtered_df, filters)
+
+show_profile(trace)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,384 @@
+import argparse
+import functools
+import os
+import threading
+import time
+
+import numpy as np
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+import analytics
+from correlation import PairStats, correlation_matrix
+from filter_index import FilterIndex
+from rollups import RollupCube
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_CSV = os.path.join(BASE_DIR, "Monetary_stats_1995-2025.csv")
+# DASHBOARD_STORE points the app at another store (e.g. a benchmark dataset)
+STORE_PATH = os.environ.get("DASHBOARD_STORE", os.path.join(BASE_DIR, "store", "monetary.arrow"))
+
+# Short canonical names for the CBSL headers (keys are the headers with
+# whitespace collapsed, so the CSV and XLSX spellings both match)
+COLUMNS = {
+    "Reserve Money (M0) (a)": "m0",
+    "Broad Money (M2) (b)": "m2",
+    "Currency held by the Public": "currency",
+    "Demand Deposits held by the Public": "demand_deposits",
+    "Narrow Money (M1) (c) (1) + (2)": "m1",
+    "Time and Savings Deposits held by the Public": "time_deposits",
+    "Broad Money (M2b) (d) (3) + (4)": "m2b",
+    "Net Foreign Assets of Monetary Authorities (e)": "nfa_monetary_authorities",
+    "Net Foreign Assets of Commercial Banks": "nfa_commercial_banks",
+    "Net Foreign Assets (NFA) (5) + (6)": "nfa",
+    "Net Credit granted to the Government by Central Bank": "ncg_central_bank",
+    "Net Credit granted to the Government by Commercial Banks": "ncg_commercial_banks",
+    "Net Credit granted to the Government (NCG) (8) + (9)": "ncg",
+    "Credit granted to Public Corporations by Commercial Banks": "credit_public_corporations",
+    "Credit granted to the Private Sector by Commercial Banks": "credit_private_sector",
+    "Domestic Credit (10) + (11) + (12)": "domestic_credit",
+    "Other Items (net)": "other_items",
+    "Net Domestic Assets (NDA) (13) + (14)": "nda",
+    "Broad Money (M2b) (7) + (15)": "m2b_source",
+}
+
+# Display labels for the canonical names
+LABELS = {short: header for header, short in COLUMNS.items()}
+LABELS["Date"] = "Date"
+
+
+def normalize_header(header):
+    return " ".join(str(header).split())
+
+
+# Read a cleaned CSV/XLSX export into a frame with canonical columns
+def read_source(path):
+    if path.lower().endswith((".xlsx", ".xls")):
+        raw = pd.read_excel(path)
+    else:
+        raw = pd.read_csv(path)
+    raw.columns = [normalize_header(c) for c in raw.columns]
+
+    unknown = [c for c in raw.columns if c != "Date" and c not in COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns in {path}: {unknown}")
+
+    dates = pd.to_datetime(raw["Date"], errors="coerce").dt.normalize()
+    df = raw.drop(columns="Date").rename(columns=COLUMNS)
+    df = df.apply(pd.to_numeric, errors="coerce")
+    df.index = pd.DatetimeIndex(dates.astype("datetime64[ns]"), name="Date")
+    df = df[df.index.notna()].sort_index()
+    return df[[c for c in COLUMNS.values() if c in df.columns]]
+
+
+# Write the frame as a single-batch, uncompressed Arrow IPC file so that every
+# column can be memory-mapped straight into NumPy. An append records the
+# version it extends and where its new rows start
+# With publish, the derived arrays of the new version are published (see
+# publish_derived()) before the store is replaced, so workers that pick up
+# the new version find them already there
+def write_store(df, path=STORE_PATH, source="", parent_version="", appended_from=None, publish=False):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Missing values stay NaN instead of becoming Arrow nulls, so the
+    # columns still map zero-copy
+    arrays = [pa.array(df.index.to_numpy())]
+    arrays += [pa.array(df[name].to_numpy(), from_pandas=False) for name in df.columns]
+    table = pa.Table.from_arrays(arrays, names=["Date"] + list(df.columns))
+    metadata = {
+        "source": os.path.basename(source),
+        "built_at": str(time.time()),
+        "version": str(time.time_ns()),
+        "rows": str(len(df)),
+    }
+    if parent_version:
+        metadata["parent_version"] = parent_version
+        metadata["appended_from"] = str(appended_from)
+    if publish:
+        publish_derived(Dataset(df, metadata["version"], path=path))
+    write_table(table.replace_schema_metadata(metadata), path)
+
+
+# Write an Arrow file atomically: readers see the old file or the new one
+def write_table(table, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+# Derived arrays that a loader process publishes next to the store, so
+# worker processes memory-map one copy instead of each building its own:
+#   values      the frame as one float64 matrix (a flat column, rows x series)
+#   indicators  the growth, rolling and ratio indicators
+# Each file's metadata carries the version of the store it was derived
+# from, and a worker only attaches to files of its own version
+DERIVED = ("values", "indicators")
+
+
+def derived_path(path, name):
+    return f"{os.path.splitext(path)[0]}.{name}.arrow"
+
+
+def publish_derived(dataset):
+    metadata = {"version": dataset.version}
+    values = np.ascontiguousarray(dataset.values)
+    table = pa.table({"values": pa.array(values.reshape(-1), from_pandas=False)})
+    write_table(table.replace_schema_metadata(metadata), derived_path(dataset.path, "values"))
+
+    indicators = dataset.indicators
+    arrays = [pa.array(indicators[name].to_numpy(), from_pandas=False) for name in indicators.columns]
+    table = pa.Table.from_arrays(arrays, names=list(indicators.columns))
+    write_table(table.replace_schema_metadata(metadata), derived_path(dataset.path, "indicators"))
+
+
+def build_store(source=SOURCE_CSV, path=STORE_PATH, publish=False):
+    df = read_source(source)
+    write_store(df, path, source, publish=publish)
+    return df
+
+
+# Append the months of a new release (a cleaned CSV/XLSX export, which may
+# repeat months that are already stored) after the store's last month. Only
+# the release is parsed: the stored columns are memory-mapped and written
+# back with the new rows. Returns the number of rows appended
+def append_store(source, path=STORE_PATH, publish=False):
+    table = open_table(path)
+    current = table_to_frame(table)
+    release = read_source(source)
+    new = release[release.index > current.index[-1]]
+    if new.empty:
+        return 0
+    new = validate_append(current, new)
+
+    metadata = table.schema.metadata or {}
+    combined = pd.concat([current, new])
+    write_store(combined, path, source, metadata.get(b"version", b"").decode(), len(current), publish)
+    return len(new)
+
+
+# New rows must have the stored series, values that fit the stored dtypes
+# and months that carry on from the last stored month without gaps or repeats
+def validate_append(current, new):
+    missing = [c for c in current.columns if c not in new.columns]
+    extra = [c for c in new.columns if c not in current.columns]
+    if missing or extra:
+        raise ValueError(f"Release columns don't match the store (missing {missing}, extra {extra})")
+
+    last = current.index[-1]
+    periods = new.index.year.to_numpy() * 12 + new.index.month.to_numpy()
+    expected = last.year * 12 + last.month + 1 + np.arange(len(new))
+    if (periods != expected).any():
+        bad = new.index[np.argmax(periods != expected)]
+        raise ValueError(f"Release doesn't continue monthly from {last:%b %Y} (found {bad:%b %Y})")
+
+    columns = {}
+    for name, dtype in current.dtypes.items():
+        values = new[name]
+        if dtype.kind in "iu":
+            if values.isna().any():
+                raise ValueError(f"Missing or non-numeric values in {LABELS[name]}")
+            if (values % 1 != 0).any():
+                raise ValueError(f"Non-integer values in {LABELS[name]}")
+        columns[name] = values.astype(dtype)
+    return pd.DataFrame(columns, index=new.index)
+
+
+def open_table(path=STORE_PATH):
+    return ipc.open_file(pa.memory_map(path)).read_all()
+
+
+# The store's table as a frame whose columns and index are read-only views
+# onto the mapped file, so nothing is parsed or copied (the index comes from
+# the Date column unless given)
+def table_to_frame(table, index=None):
+    columns = {}
+    for name in table.column_names:
+        if name != "Date":
+            columns[name] = table.column(name).chunk(0).to_numpy(zero_copy_only=True)
+    if index is None:
+        dates = table.column("Date").chunk(0).to_numpy(zero_copy_only=True)
+        index = pd.DatetimeIndex(dates, name="Date", copy=False)
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+# Shared, read-only dataset. One instance is shared by every session: the
+# frame's buffers are the read-only memory map, and sessions only ever get
+# views of it (slices or row takes) to derive their own columns from
+class Dataset:
+    def __init__(self, frame, version="", parent_version="", appended_from=None, path=None):
+        self.frame = frame
+        self.path = path
+        self.version = version
+        self.parent_version = parent_version
+        self.appended_from = appended_from
+        self.filter_index = FilterIndex(frame.index)
+        self.years = self.filter_index.years
+        self.month_names = self.filter_index.month_names
+
+    @classmethod
+    def open(cls, path=STORE_PATH):
+        table = open_table(path)
+        metadata = table.schema.metadata or {}
+        appended_from = metadata.get(b"appended_from")
+        return cls(
+            table_to_frame(table),
+            metadata.get(b"version", b"").decode(),
+            metadata.get(b"parent_version", b"").decode(),
+            int(appended_from) if appended_from else None,
+            path,
+        )
+
+    # Filtered view for a sidebar selection; never a copy of the full frame
+    def view(self, year='All', quarter='All', month='All'):
+        return self.filter_index.select(self.frame, year, quarter, month)
+
+    # Cache key for a selection
+    def filter_key(self, year='All', quarter='All', month='All'):
+        return self.filter_index.normalize(year, quarter, month)
+
+    # Whether a selection has rows appended since the parent version (every
+    # selection counts as changed for a fresh build)
+    def changed(self, year='All', quarter='All', month='All'):
+        if self.appended_from is None:
+            return True
+        return self.filter_index.reaches(self.appended_from, year, quarter, month)
+
+    # Take over the derived data already built for the parent version,
+    # extending it with the appended rows instead of rebuilding it
+    # (published arrays of this version are mapped instead)
+    def inherit(self, parent):
+        if "rollups" in parent.__dict__:
+            self.rollups = RollupCube(self.frame, self.filter_index, parent.rollups, self.values)
+        if "indicators" in parent.__dict__ and self.published("indicators") is None:
+            self.indicators = analytics.extend_indicators(
+                parent.indicators, self.frame, self.filter_index.period_keys)
+        if "pair_stats" in parent.__dict__:
+            self.pair_stats = PairStats(self.frame, self.filter_index, parent=parent.pair_stats,
+                                        values=self.values)
+
+    # The published derived table of this version, or None
+    def published(self, name):
+        if self.path is None:
+            return None
+        try:
+            table = open_table(derived_path(self.path, name))
+        except (FileNotFoundError, pa.ArrowInvalid):
+            return None
+        metadata = table.schema.metadata or {}
+        if metadata.get(b"version", b"").decode() != self.version:
+            return None
+        return table
+
+    # The frame as a float matrix (rows x series) for the rollups and pair
+    # statistics: a read-only view of the published copy when there is one
+    @functools.cached_property
+    def values(self):
+        table = self.published("values")
+        if table is not None:
+            flat = table.column("values").chunk(0).to_numpy(zero_copy_only=True)
+            return flat.reshape(len(self.frame), -1)
+        return self.frame.to_numpy(dtype=float)
+
+    # Growth, rolling and ratio indicators for every row of the frame
+    # (read-only views of the published copy when there is one)
+    @functools.cached_property
+    def indicators(self):
+        table = self.published("indicators")
+        if table is not None:
+            return table_to_frame(table, self.frame.index)
+        return analytics.compute_indicators(self.frame, self.filter_index.period_keys)
+
+    # Indicator rows for a selection (a view, like view()), optionally only
+    # the given indicators
+    def indicator_view(self, year='All', quarter='All', month='All', columns=None):
+        indicators = self.indicators if columns is None else self.indicators[list(columns)]
+        return self.filter_index.select(indicators, year, quarter, month)
+
+    # Headline figures for a selection as (value, month) pairs: the peak
+    # year-on-year M2 growth and the highest M1 and M0. The value is NaN and
+    # the month None when the selection has no values
+    def kpis(self, year='All', quarter='All', month='All'):
+        m2_yoy = self.indicator_view(year, quarter, month)["m2_yoy"]
+        peak = m2_yoy.max()
+        kpis = {"peak_m2_growth": (peak, None if pd.isna(peak) else m2_yoy.idxmax())}
+        summary = self.rollups.selection(year, quarter, month)
+        for name in ("m1", "m0"):
+            date = summary.at[name, "argmax"]
+            kpis[f"max_{name}"] = (summary.at[name, "max"], None if pd.isna(date) else date)
+        return kpis
+
+    # Pearson correlation matrix of columns over a selection
+    def correlation(self, columns, year='All', quarter='All', month='All'):
+        return correlation_matrix(self.view(year, quarter, month)[list(columns)])
+
+    # Yearly / quarterly / monthly rollups and per-selection summaries
+    @functools.cached_property
+    def rollups(self):
+        return RollupCube(self.frame, self.filter_index, values=self.values)
+
+    # Pairwise correlation / best-fit statistics for the Relationship Explorer
+    @functools.cached_property
+    def pair_stats(self):
+        return PairStats(self.frame, self.filter_index, values=self.values)
+
+
+# The dataset shared by all sessions. The store is reopened (with opener,
+# Dataset.open unless given) when its file changes (a new inode, mtime or
+# size, since a rewrite can land within the mtime's resolution), and an append to the
+# open version inherits its derived data. A replaced dataset stays usable
+# for reruns that started on it; it is closed (if it has anything to close,
+# like a DuckDB connection) when it is replaced in turn
+class SharedDataset:
+    def __init__(self, path=STORE_PATH, opener=None):
+        self.path = path
+        self.opener = opener or Dataset.open
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.dataset = None
+        self.replaced = None
+
+    def current(self):
+        stat = os.stat(self.path)
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if stamp != self.stamp:
+            with self.lock:
+                if stamp != self.stamp:
+                    dataset = self.opener(self.path)
+                    if self.dataset is not None and dataset.parent_version == self.dataset.version:
+                        dataset.inherit(self.dataset)
+                    close = getattr(self.replaced, "close", None)
+                    if close is not None:
+                        close()
+                    self.replaced, self.dataset = self.dataset, dataset
+                    self.stamp = stamp
+        return self.dataset
+
+
+# (Re)build the store when it is missing or older than its source
+def ensure_store(source=SOURCE_CSV, path=STORE_PATH):
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source):
+        build_store(source, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the columnar monetary data store")
+    parser.add_argument("--source", default=SOURCE_CSV, help="cleaned CSV or XLSX export")
+    parser.add_argument("--store", default=STORE_PATH, help="output Arrow file")
+    parser.add_argument("--append", action="store_true",
+                        help="append the months of SOURCE after the store's last month")
+    parser.add_argument("--publish", action="store_true",
+                        help="also publish the derived arrays for worker processes to map")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.append:
+        rows = append_store(args.source, args.store, args.publish)
+        print(f"Appended {rows} rows to {args.store} in {time.perf_counter() - start:.3f}s")
+    else:
+        df = build_store(args.source, args.store, args.publish)
+        print(f"Wrote {len(df)} rows x {df.shape[1]} series to {args.store} "
+              f"in {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+
+# Points per trace for a full-width chart (about one per horizontal pixel);
+# charts in a column get their share of it
+CHART_WIDTH_PX = int(os.environ.get("DASHBOARD_CHART_WIDTH_PX", "1400"))
+
+
+# Largest-Triangle-Three-Buckets: positions of up to `threshold` points of
+# (x, y) that keep the visual shape of the line. The first and last points
+# are always kept; every bucket in between keeps the point forming the
+# largest triangle with the previous pick and the next bucket's average
+def lttb(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    picks = np.empty(threshold, dtype=int)
+    picks[0] = 0
+    picks[-1] = n - 1
+    for b in range(threshold - 2):
+        start, stop = edges[b], edges[b + 1]
+        following = slice(stop, edges[b + 2]) if b + 2 < len(edges) else slice(n - 1, n)
+        prev_x, prev_y = x[picks[b]], y[picks[b]]
+        next_x = x[following].mean()
+        next_ys = y[following][~np.isnan(y[following])]
+        next_y = next_ys.mean() if len(next_ys) else prev_y
+        area = np.abs((prev_x - next_x) * (y[start:stop] - prev_y)
+                      - (prev_x - x[start:stop]) * (next_y - prev_y))
+        picks[b + 1] = start + np.argmax(np.nan_to_num(area, nan=-1.0))
+    return picks
+
+
+# Rows of a date-indexed frame to plot so that each of its traces (which
+# share the x axis) has at most max_points points: every column gets an
+# equal share of LTTB picks and the union of the picks is kept
+def downsample(df, columns, width=1.0, max_points=None):
+    if max_points is None:
+        max_points = int(CHART_WIDTH_PX * width)
+    if len(df) <= max_points:
+        return df
+    x = df.index.asi8 if hasattr(df.index, "asi8") else np.arange(len(df))
+    share = max(max_points // len(columns), 3)
+    rows = np.unique(np.concatenate([lttb(x, df[c].to_numpy(dtype=float), share) for c in columns]))
+    return df.take(rows)
@@ -0,0 +1,377 @@
+import argparse
+import glob
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import analytics
+import data_store
+from filter_index import MONTH_NUMBERS, QUARTERS, normalize_selection
+from rollups import STATS
+
+# Parquet copy of the store for the DuckDB query backend, one directory per
+# store version (partitioned by year, so a year filter only reads its own
+# files) and a CURRENT file naming the version to query
+PARQUET_DIR = os.path.join(os.path.dirname(data_store.STORE_PATH), "parquet")
+# DuckDB's memory limit (e.g. "1GB"); beyond it, queries spill to disk
+MEMORY_LIMIT = os.environ.get("DASHBOARD_DUCKDB_MEMORY")
+
+
+def pointer_path(parquet_dir=PARQUET_DIR):
+    return os.path.join(parquet_dir, "CURRENT")
+
+
+def current_version(parquet_dir=PARQUET_DIR):
+    try:
+        with open(pointer_path(parquet_dir), encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+# Write a store version as hive-partitioned Parquet (Year=<year>/ files) and
+# point CURRENT at it. Missing values are written as nulls, which SQL
+# aggregates skip like the in-memory rollups skip NaN. The previous version
+# is kept for queries still running on it; older ones are removed
+def export_parquet(store_path=data_store.STORE_PATH, parquet_dir=PARQUET_DIR):
+    import pyarrow.dataset as ds
+
+    table = data_store.open_table(store_path)
+    metadata = table.schema.metadata or {}
+    version = metadata.get(b"version", b"").decode() or str(time.time_ns())
+    columns = {"Date": table.column("Date")}
+    for name in table.column_names[1:]:
+        column = table.column(name)
+        if pa.types.is_floating(column.type):
+            column = pc.if_else(pc.is_nan(column), pa.scalar(None, column.type), column)
+        columns[name] = column
+    columns["Year"] = pc.year(table.column("Date"))
+    parquet = pa.table(columns)
+
+    target = os.path.join(parquet_dir, version)
+    tmp_dir = f"{target}.{os.getpid()}.tmp"
+    ds.write_dataset(parquet, tmp_dir, format="parquet", partitioning=["Year"],
+                     partitioning_flavor="hive", existing_data_behavior="delete_matching")
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.replace(tmp_dir, target)
+
+    previous = current_version(parquet_dir)
+    tmp_pointer = f"{pointer_path(parquet_dir)}.{os.getpid()}.tmp"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_pointer, pointer_path(parquet_dir))
+
+    for name in os.listdir(parquet_dir):
+        path = os.path.join(parquet_dir, name)
+        if os.path.isdir(path) and name not in (version, previous) and not name.endswith(".tmp"):
+            shutil.rmtree(path, ignore_errors=True)
+    return version
+
+
+# (Re)export the Parquet copy when it is missing or behind the store
+def ensure_parquet(store_path=None, parquet_dir=PARQUET_DIR):
+    store_path = store_path or data_store.ensure_store()
+    metadata = data_store.open_table(store_path).schema.metadata or {}
+    version = metadata.get(b"version", b"").decode()
+    if not version or current_version(parquet_dir) != version:
+        export_parquet(store_path, parquet_dir)
+    return pointer_path(parquet_dir)
+
+
+# Open an Arrow store for querying through its Parquet copy, exporting the
+# store first when the copy is behind it (e.g. after an --append), so that
+# data_store.SharedDataset, watching the store, picks up new months
+def open_store(store_path=None, parquet_dir=PARQUET_DIR):
+    return QueryDataset.open(ensure_parquet(store_path, parquet_dir))
+
+
+# SQL condition and parameters for a sidebar selection. The year is the
+# partition column, so DuckDB skips the other years' files
+def where(year='All', quarter='All', month='All'):
+    conditions, params = [], []
+    if year != 'All':
+        conditions.append("Year = ?")
+        params.append(int(year))
+    if quarter != 'All':
+        conditions.append("quarter(Date) = ?")
+        params.append(QUARTERS[quarter])
+    if month != 'All':
+        conditions.append("month(Date) = ?")
+        params.append(MONTH_NUMBERS[month])
+    return " AND ".join(conditions) or "TRUE", params
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def as_float(value):
+    return np.nan if value is None else float(value)
+
+
+# Dataset backed by DuckDB queries over the Parquet copy, with the interface
+# of data_store.Dataset: filters, rollups, indicators and correlations
+# compile to SQL and only their results are materialized, so memory follows
+# the size of a selection rather than the length of the history. Every
+# query runs on its own cursor, so sessions can query concurrently
+class QueryDataset:
+    def __init__(self, parquet_dir=PARQUET_DIR, version=None):
+        import duckdb
+
+        self.version = version or current_version(parquet_dir)
+        if self.version is None:
+            raise FileNotFoundError(f"No Parquet store in {parquet_dir}")
+        self.parent_version = ""
+        config = {"memory_limit": MEMORY_LIMIT} if MEMORY_LIMIT else {}
+        self.connection = duckdb.connect(config=config)
+        files = os.path.join(parquet_dir, self.version, "**", "*.parquet")
+        self.connection.execute(
+            f"CREATE VIEW monetary AS SELECT * FROM read_parquet('{files}', hive_partitioning = true)")
+
+        schema = self.query("DESCRIBE monetary")
+        self.columns = [name for name in schema["column_name"] if name not in ("Date", "Year")]
+        self.years = [int(y) for y in self.query("SELECT DISTINCT Year FROM monetary ORDER BY Year")["Year"]]
+        months = self.query("SELECT monthname(min(Date)) AS name FROM monetary "
+                            "GROUP BY month(Date) ORDER BY min(Date)")
+        self.month_names = list(months["name"])
+        self.rollups = QueryRollups(self)
+        self.pair_stats = QueryPairStats(self)
+
+    @classmethod
+    def open(cls, pointer=None):
+        return cls(os.path.dirname(pointer) if pointer else PARQUET_DIR)
+
+    # The connection is closed once no query can still need it (see
+    # data_store.SharedDataset)
+    def close(self):
+        self.connection.close()
+
+    # Result of a query as a frame
+    def query(self, sql, params=None):
+        return self.connection.cursor().execute(sql, params or []).df()
+
+    # Rows of a selection, indexed by date like Dataset.view()
+    def view(self, year='All', quarter='All', month='All'):
+        condition, params = where(year, quarter, month)
+        columns = ", ".join(quote(name) for name in ["Date"] + self.columns)
+        frame = self.query(f"SELECT {columns} FROM monetary WHERE {condition} ORDER BY Date", params)
+        return frame.set_index("Date")
+
+    def filter_key(self, year='All', quarter='All', month='All'):
+        return normalize_selection(year, quarter, month)
+
+    # Each Parquet version is queried afresh, so nothing is carried over
+    def changed(self, year='All', quarter='All', month='All'):
+        return True
+
+    # The indicators are computed per query, with the rest of the history
+    # seen through window functions
+    @property
+    def indicators(self):
+        return self.indicator_view()
+
+    # Indicator rows for a selection (only the given indicators, if any),
+    # named and defined as in analytics.compute_indicators
+    def indicator_view(self, year='All', quarter='All', month='All', columns=None):
+        expressions = self._indicator_expressions()
+        columns = list(expressions) if columns is None else list(columns)
+        unknown = [name for name in columns if name not in expressions]
+        if unknown:
+            raise KeyError(f"Unknown indicators: {unknown}")
+
+        cast = ", ".join(f"{quote(c)}::DOUBLE AS {quote(c)}" for c in self.columns)
+        firsts = ", ".join(f"arg_min_null({quote(c)}, Date) AS {quote(c)}" for c in self.columns)
+        changes = ", ".join(
+            f"(b.{quote(c)} / {alias}.{quote(c)} - 1) * 100 AS {quote(f'{c}_{kind}')}"
+            for c in self.columns for kind, alias in (("mom", "m"), ("yoy", "y")))
+        selected = ", ".join(f"{expressions[name]} AS {quote(name)}" for name in columns)
+        condition, params = where(year, quarter, month)
+        sql = f"""
+            WITH base AS (
+                SELECT Date, Year, Year * 12 + month(Date) - 1 AS period, {cast} FROM monetary
+            ),
+            firsts AS (SELECT period, {firsts} FROM base GROUP BY period),
+            changes AS (
+                SELECT b.*, {changes} FROM base b
+                LEFT JOIN firsts m ON m.period = b.period - 1
+                LEFT JOIN firsts y ON y.period = b.period - 12
+            ),
+            indicators AS (
+                SELECT Date, Year{', ' + selected if selected else ''} FROM changes
+                WINDOW {', '.join(f'w{w} AS (ORDER BY Date ROWS {w - 1} PRECEDING)' for w in analytics.WINDOWS)}
+            )
+            SELECT * EXCLUDE (Year) FROM indicators WHERE {condition} ORDER BY Date
+        """
+        return self.query(sql, params).set_index("Date")
+
+    # SQL for each indicator over the `changes` rows; a window only gives a
+    # value once it holds `window` non-missing values, like the NaN-aware
+    # numpy windows
+    def _indicator_expressions(self):
+        expressions = {}
+        for name in self.columns:
+            c = quote(name)
+            mom = quote(f"{name}_mom")
+            expressions[f"{name}_mom"] = mom
+            expressions[f"{name}_yoy"] = quote(f"{name}_yoy")
+            for window in analytics.WINDOWS:
+                expressions[f"{name}_mean_{window}"] = (
+                    f"CASE WHEN count({c}) OVER w{window} = {window} THEN avg({c}) OVER w{window} END")
+            expressions[f"{name}_vol_12"] = (
+                f"CASE WHEN count({mom}) OVER w12 = 12 THEN stddev_samp({mom}) OVER w12 END")
+            expressions[f"{name}_z_12"] = (
+                f"CASE WHEN count({c}) OVER w12 = 12 THEN "
+                f"({c} - avg({c}) OVER w12) / stddev_samp({c}) OVER w12 END")
+        for ratio, (numerator, denominator) in analytics.RATIOS.items():
+            expressions[ratio] = f"{quote(numerator)} / {quote(denominator)}"
+        return expressions
+
+    # Same headline figures as Dataset.kpis(); ties go to the earliest month
+    def kpis(self, year='All', quarter='All', month='All'):
+        m2_yoy = self.indicator_view(year, quarter, month, ["m2_yoy"])["m2_yoy"].dropna()
+        kpis = {"peak_m2_growth": (np.nan, None)}
+        if len(m2_yoy):
+            kpis["peak_m2_growth"] = (m2_yoy.max(), m2_yoy.idxmax())
+        condition, params = where(year, quarter, month)
+        for name in ("m1", "m0"):
+            top = self.query(f"SELECT Date, {quote(name)}::DOUBLE AS value FROM monetary "
+                             f"WHERE {condition} AND {quote(name)} IS NOT NULL "
+                             f"ORDER BY value DESC, Date LIMIT 1", params)
+            kpis[f"max_{name}"] = (top["value"].iloc[0], top["Date"].iloc[0]) if len(top) else (np.nan, None)
+        return kpis
+
+    # Pearson correlation matrix of columns over a selection, in one pass
+    def correlation(self, columns, year='All', quarter='All', month='All'):
+        condition, params = where(year, quarter, month)
+        cells = ", ".join(f"corr({quote(a)}, {quote(b)})" for a in columns for b in columns)
+        row = self.connection.cursor().execute(
+            f"SELECT {cells} FROM monetary WHERE {condition}", params).fetchone()
+        corr = np.array([as_float(v) for v in row]).reshape(len(columns), len(columns))
+        return pd.DataFrame(np.clip(corr, -1.0, 1.0), index=columns, columns=columns)
+
+
+# Per-year rollups as GROUP BY queries (RollupCube's yearly() interface)
+class QueryRollups:
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def yearly(self, stat, year='All', quarter='All', month='All'):
+        if stat not in STATS:
+            raise KeyError(stat)
+        columns = self.dataset.columns
+        year, quarter, month = normalize_selection(year, quarter, month)
+        if quarter != 'All' and month != 'All':
+            # A month outside the selected quarter
+            empty = pd.Index([], dtype="int32", name="Year")
+            return pd.DataFrame({c: pd.Series(index=empty, dtype=float) for c in columns})
+
+        # Periods of the grain the selection picks from: years, quarters or
+        # months. Growth compares consecutive periods of the whole grain, so
+        # only the other stats push the selection into the scan
+        if month != 'All':
+            period = ", month(Date) AS period"
+        elif quarter != 'All':
+            period = ", quarter(Date) AS period"
+        else:
+            period = ""
+        keys = "Year" + (", period" if period else "")
+        scan_condition, scan_params = where(year, quarter, month) if stat != "growth" else ("TRUE", [])
+        condition, params = where(year, quarter, month)
+        condition = condition.replace("quarter(Date)", "period").replace("month(Date)", "period")
+
+        if stat == "argmax":
+            # First month holding each period's maximum
+            maxima = ", ".join(f"max({quote(c)}) OVER (PARTITION BY {keys}) AS {quote(c + '_max')}"
+                               for c in columns)
+            cells = ", ".join(f"min(Date) FILTER (WHERE {quote(c)} = {quote(c + '_max')}) AS {quote(c)}"
+                              for c in columns)
+            source = f"(SELECT *{period}, {maxima} FROM monetary WHERE {scan_condition})"
+        else:
+            aggregate = {"sum": "coalesce(sum({}), 0)", "mean": "avg({})", "min": "min({})",
+                         "max": "max({})", "growth": "avg({})"}[stat]
+            cells = ", ".join(f"{aggregate.format(quote(c) + '::DOUBLE')} AS {quote(c)}" for c in columns)
+            source = f"(SELECT *{period} FROM monetary WHERE {scan_condition})"
+        table = f"SELECT {keys}, {cells} FROM {source} GROUP BY {keys}"
+        if stat == "growth":
+            changes = ", ".join(f"({quote(c)} / lag({quote(c)}) OVER (ORDER BY {keys}) - 1) * 100 AS {quote(c)}"
+                                for c in columns)
+            table = f"SELECT {keys}, {changes} FROM ({table})"
+        sql = f"SELECT Year, {', '.join(quote(c) for c in columns)} FROM ({table}) " \
+              f"WHERE {condition} ORDER BY {keys}"
+        frame = self.dataset.query(sql, scan_params + params).set_index("Year")
+        # Year as the int32 the in-memory rollups use (pandas' DatetimeIndex.year)
+        frame.index = frame.index.astype("int32")
+        return frame
+
+
+# Pair statistics as aggregate queries over a selection (PairStats'
+# interface). Spearman ranks each series over the selection's values with
+# ties averaged, as DataFrame.rank() does
+class QueryPairStats:
+    window = 12
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def _fetch(self, sql, params):
+        return self.dataset.connection.cursor().execute(sql, params).fetchone()
+
+    def pearson_for(self, key, x_variable, y_variable):
+        condition, params = where(*key)
+        x, y = quote(x_variable), quote(y_variable)
+        return as_float(self._fetch(f"SELECT corr({x}, {y}) FROM monetary WHERE {condition}", params)[0])
+
+    # (slope, intercept) of the best-fit line of y on x
+    def fit_for(self, key, x_variable, y_variable):
+        condition, params = where(*key)
+        x, y = quote(x_variable), quote(y_variable)
+        row = self._fetch(f"SELECT regr_slope({y}, {x}), regr_intercept({y}, {x}) "
+                          f"FROM monetary WHERE {condition}", params)
+        return as_float(row[0]), as_float(row[1])
+
+    def spearman_for(self, key, x_variable, y_variable):
+        condition, params = where(*key)
+
+        def rank(name):
+            c = quote(name)
+            return (f"CASE WHEN {c} IS NOT NULL THEN rank() OVER (ORDER BY {c}) "
+                    f"+ (count(*) OVER (PARTITION BY {c}) - 1) / 2 END")
+
+        sql = (f"SELECT corr(rx, ry) FROM (SELECT {rank(x_variable)} AS rx, {rank(y_variable)} AS ry "
+               f"FROM monetary WHERE {condition})")
+        return as_float(self._fetch(sql, params)[0])
+
+    # Trailing-window correlation over the full history (so a filtered view
+    # still sees the preceding periods), returned for the rows of a selection
+    def rolling_for(self, key, x_variable, y_variable):
+        condition, params = where(*key)
+        x, y = quote(x_variable), quote(y_variable)
+        window = f"(ORDER BY Date ROWS {self.window - 1} PRECEDING)"
+        sql = f"""
+            SELECT Date, correlation FROM (
+                SELECT Date, Year, CASE WHEN row_number() OVER (ORDER BY Date) >= {self.window}
+                    THEN greatest(least(corr({x}, {y}) OVER {window}, 1), -1) END AS correlation
+                FROM monetary
+            ) WHERE {condition} ORDER BY Date
+        """
+        frame = self.dataset.query(sql, params)
+        return pd.Series(frame["correlation"].to_numpy(dtype=float), index=pd.DatetimeIndex(frame["Date"]),
+                         name="Rolling Correlation")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the Arrow store as partitioned Parquet for DuckDB")
+    parser.add_argument("--store", default=data_store.STORE_PATH, help="Arrow store to export")
+    parser.add_argument("--output", default=PARQUET_DIR, help="Parquet directory")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    version = export_parquet(args.store, args.output)
+    files = glob.glob(os.path.join(args.output, version, "**", "*.parquet"), recursive=True)
+    print(f"Wrote version {version} ({len(files)} files) to {args.output} in {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,71 @@
+import gzip
+import os
+import threading
+
+import pyarrow as pa
+
+from data_store import LABELS, STORE_PATH
+
+EXPORT_DIR = os.path.join(os.path.dirname(STORE_PATH), "exports")
+CHUNK_ROWS = 50_000
+
+# Export formats: label -> (file extension, MIME type)
+FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "CSV (gzip)": (".csv.gz", "application/gzip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+# Path of the export of a selection in a format, written on first request.
+# Files are named after the dataset version, selection and format, so each
+# one is written once and later downloads just read it back. Rows are
+# written in chunks, so writing a large export never builds the whole file
+# in memory (the dashboard still reads it whole for the download)
+def export_file(dataset, filters, fmt, export_dir=EXPORT_DIR):
+    extension = FORMATS[fmt][0]
+    version = dataset.version or "dev"
+    name = "-".join([version] + [str(part) for part in filters]) + extension
+    path = os.path.join(export_dir, name)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(export_dir, exist_ok=True)
+    frame = dataset.view(*filters).rename(columns=LABELS)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if fmt == "Parquet":
+        write_parquet(frame, tmp_path)
+    else:
+        write_csv(frame, tmp_path, compress=extension.endswith(".gz"))
+    os.replace(tmp_path, path)
+    remove_stale(export_dir, version)
+    return path
+
+
+def write_csv(frame, path, compress=False):
+    opener = gzip.open if compress else open
+    with opener(path, "wt", newline="", encoding="utf-8") as out:
+        frame.iloc[:0].to_csv(out)
+        for start in range(0, len(frame), CHUNK_ROWS):
+            frame.iloc[start:start + CHUNK_ROWS].to_csv(out, header=False)
+
+
+def write_parquet(frame, path):
+    # Only loaded for Parquet exports
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(frame, preserve_index=True)
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, max(len(frame), 1), CHUNK_ROWS):
+            chunk = frame.iloc[start:start + CHUNK_ROWS]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=True))
+
+
+# Exports of older dataset versions are never downloaded again
+def remove_stale(export_dir, version):
+    for name in os.listdir(export_dir):
+        if not name.startswith(version + "-") and not name.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(export_dir, name))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,86 @@
+import math
+import threading
+from collections import OrderedDict
+
+
+# A key with NaN and infinite floats (e.g. the fit of a selection too small
+# to have one) replaced by None: NaN never equals itself, so a key holding
+# it would never be found again
+def normalise_key(key):
+    if isinstance(key, tuple):
+        return tuple(normalise_key(part) for part in key)
+    if isinstance(key, float) and not math.isfinite(key):
+        return None
+    return key
+
+
+# Process-wide LRU cache of serialized figures keyed by (chart id, filter
+# state). Entries are figure JSON strings and their total length is kept under
+# max_bytes. The whole cache is dropped when the dataset version changes,
+# unless the new version is an append to the cached one: then only the
+# entries whose key the changed() predicate matches are dropped.
+class FigureCache:
+    def __init__(self, max_bytes=64 * 2**20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # Cached JSON for the chart, calling build() (which returns JSON) on a miss
+    def get(self, chart_id, key, version, build, parent_version=None, changed=None):
+        cache_key = (chart_id, normalise_key(key))
+        with self.lock:
+            if version != self.version:
+                if changed is not None and parent_version == self.version:
+                    self._invalidate(changed)
+                else:
+                    self._clear()
+                self.version = version
+            fig_json = self.entries.get(cache_key)
+            if fig_json is not None:
+                self.entries.move_to_end(cache_key)
+                self.hits += 1
+                return fig_json
+            self.misses += 1
+
+        # Build outside the lock so other charts aren't blocked meanwhile
+        fig_json = build()
+        with self.lock:
+            if version == self.version and cache_key not in self.entries:
+                self.entries[cache_key] = fig_json
+                self.size += len(fig_json)
+                while self.size > self.max_bytes and self.entries:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return fig_json
+
+    def clear(self):
+        with self.lock:
+            self._clear()
+
+    def _invalidate(self, changed):
+        for cache_key in [k for k in self.entries if changed(k[1])]:
+            self.size -= len(self.entries.pop(cache_key))
+
+    def _clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        with self.lock:
+            # Serialized size of each cached figure, per chart
+            bytes_by_chart = {}
+            for (chart_id, _), fig_json in self.entries.items():
+                bytes_by_chart.setdefault(chart_id, []).append(len(fig_json))
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "version": self.version,
+                "bytes_by_chart": bytes_by_chart,
+            }
@@ -0,0 +1,472 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from analytics import RATIO_LABELS
+from correlation import correlation_matrix
+from data_store import LABELS
+from downsample import downsample
+
+# plotly.express (about 100 ms to import) and make_subplots are imported by
+# the charts that use them, so a cold start only loads graph_objects
+
+# Define the credit-related columns and money supply columns with short names
+CREDIT_COLUMNS = {
+    "ncg_central_bank": "Govt Credit by Central Bank",
+    "ncg_commercial_banks": "Govt Credit by Commercial Banks",
+    "ncg": "Total Govt Credit (NCG)",
+    "credit_public_corporations": "Credit to Public Corporations",
+    "credit_private_sector": "Credit to Private Sector",
+    "domestic_credit": "Total Domestic Credit"
+}
+MONEY_SUPPLY_COLUMNS = {
+    "m1": "Narrow Money (M1)",
+    "m2": "Broad Money (M2)",
+    "m2b": "Broad Money (M2b)"
+}
+
+# Variables for selection in the Relationship Explorer
+AVAILABLE_VARIABLES = [
+    "m0",
+    "m2",
+    "currency",
+    "demand_deposits",
+    "m1",
+    "time_deposits",
+    "m2b",
+    "nfa_monetary_authorities",
+    "nfa_commercial_banks",
+    "nfa",
+    "ncg_central_bank",
+    "ncg_commercial_banks",
+    "ncg",
+    "credit_public_corporations",
+    "credit_private_sector",
+    "domestic_credit",
+    "nda",
+    "m2b_source"
+]
+
+
+# Shown in place of a chart or card for a selection without rows
+NO_DATA = "No data for this selection"
+
+
+# Line chart: M0, M1, M2, M3 over time
+def money_supply_lines(filtered_df):
+    filtered_df = downsample(filtered_df, ["m0", "m1", "m2", "m2b"], width=0.5)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=filtered_df.index, y=filtered_df["m0"], mode='lines', name='M0'))
+    fig.add_trace(go.Scatter(x=filtered_df.index, y=filtered_df["m1"], mode='lines', name='M1'))
+    fig.add_trace(go.Scatter(x=filtered_df.index, y=filtered_df["m2"], mode='lines', name='M2'))
+    fig.add_trace(go.Scatter(x=filtered_df.index, y=filtered_df["m2b"], mode='lines', name='M2b'))
+
+    fig.update_layout(
+        title='Money Supply Measures Over Time',
+        xaxis_title='Date',
+        yaxis_title='Rs. Mn',
+        legend_title='Money Supply Types'
+    )
+    return fig
+
+
+# Bar chart or stacked area: Year-wise composition of money supply
+def money_supply_bars(filtered_df):
+    filtered_df = downsample(filtered_df, ["m0", "m1", "m2", "m2b"], width=0.5)
+    fig2 = go.Figure()
+    fig2.add_trace(go.Bar(x=filtered_df.index, y=filtered_df["m0"], name='M0'))
+    fig2.add_trace(go.Bar(x=filtered_df.index, y=filtered_df["m1"], name='M1'))
+    fig2.add_trace(go.Bar(x=filtered_df.index, y=filtered_df["m2"], name='M2'))
+    fig2.add_trace(go.Bar(x=filtered_df.index, y=filtered_df["m2b"], name='M2b'))
+
+    fig2.update_layout(
+        title='Distribution of Money Supply Components',
+        xaxis_title='Date',
+        yaxis_title='Rs. Mn',
+        barmode='stack',
+        legend_title='Money Supply Types'
+    )
+    return fig2
+
+
+# Pie chart of the latest available data for the components (an empty pie
+# with a note for a selection without rows)
+def money_supply_pie(filtered_df):
+    labels = ['M0', 'M1', 'M2', 'M2b']
+    if len(filtered_df) == 0:
+        fig4 = go.Figure(data=[go.Pie(labels=labels, values=[], hole=0.3)])
+        fig4.add_annotation(text=NO_DATA, showarrow=False)
+        fig4.update_layout(title='Pie Chart of Money Supply Components')
+        return fig4
+
+    latest_data = filtered_df.iloc[-1]
+    money_supply = [
+        latest_data["m0"],
+        latest_data["m1"],
+        latest_data["m2"],
+        latest_data["m2b"]
+    ]
+
+    fig4 = go.Figure(data=[go.Pie(labels=labels, values=money_supply, hole=0.3)])
+
+    fig4.update_layout(
+        title='Pie Chart of Money Supply Components',
+        legend_title='Money Supply Types'
+    )
+    return fig4
+
+
+# Dual-axis chart: M2 vs Private Sector Credit
+def credit_vs_m2(filtered_df):
+    from plotly.subplots import make_subplots
+
+    filtered_df = downsample(filtered_df, ["m2", "credit_private_sector"], width=0.5)
+    fig5 = make_subplots(specs=[[{"secondary_y": True}]])
+
+    fig5.add_trace(
+        go.Scatter(x=filtered_df.index, y=filtered_df["m2"], name="M2"),
+        secondary_y=False,
+    )
+
+    fig5.add_trace(
+        go.Scatter(x=filtered_df.index, y=filtered_df["credit_private_sector"], name="Private Sector Credit"),
+        secondary_y=True,
+    )
+
+    fig5.update_layout(
+        title_text="M2 vs Private Sector Credit",
+        xaxis_title="Date"
+    )
+
+    fig5.update_yaxes(title_text="M2 (Rs. Mn)", secondary_y=False)
+    fig5.update_yaxes(title_text="Private Sector Credit (Rs. Mn)", secondary_y=True)
+    return fig5
+
+
+# Line chart: credit columns
+def credit_lines(filtered_df):
+    filtered_df = downsample(filtered_df, list(CREDIT_COLUMNS), width=0.5)
+    fig4 = go.Figure()
+    for old_col, new_col in CREDIT_COLUMNS.items():
+        fig4.add_trace(go.Scatter(x=filtered_df.index, y=filtered_df[old_col], mode='lines', name=new_col))
+    fig4.update_layout(
+        title='Credit Growth Over Time',
+        xaxis_title='Date',
+        yaxis_title='Credit Amount (Rs. Mn)',
+        legend_title='Credit Types'
+    )
+    return fig4
+
+
+# Columns of the credit / money supply correlation heatmap, by short name
+CORRELATION_COLUMNS = {**CREDIT_COLUMNS, **MONEY_SUPPLY_COLUMNS}
+
+
+# Heatmap of the correlations between credit and money supply variables
+def credit_correlation(filtered_df):
+    # Correlation matrix of the original columns (keys)
+    return correlation_heatmap(correlation_matrix(filtered_df[list(CORRELATION_COLUMNS)]))
+
+
+# The heatmap for a correlation matrix of CORRELATION_COLUMNS (e.g. from
+# dataset.correlation()), labelled with their short names
+def correlation_heatmap(corr_df):
+    corr_df = corr_df.rename(index=CORRELATION_COLUMNS, columns=CORRELATION_COLUMNS)
+    corr_z = corr_df.values
+    # Correlation values as cell text, white on the strongly coloured cells
+    labels = np.char.mod("%.2f", corr_z)
+    strong = np.abs(corr_z) > 0.5
+    # Create a heatmap using go.Heatmap
+    fig6 = go.Figure(data=go.Heatmap(
+        z=corr_z,
+        x=corr_df.columns,
+        y=corr_df.columns,
+        colorscale='RdBu_r',
+        zmin=-1,
+        zmax=1,
+        text=np.where(strong, "", labels),
+        texttemplate="%{text}",
+        textfont=dict(color="black")
+    ))
+    # Heatmap text has a single font colour, so the white labels come from a
+    # transparent copy of the trace drawn on top
+    fig6.add_trace(go.Heatmap(
+        z=corr_z,
+        x=corr_df.columns,
+        y=corr_df.columns,
+        colorscale=[[0, 'rgba(0,0,0,0)'], [1, 'rgba(0,0,0,0)']],
+        showscale=False,
+        hoverinfo='skip',
+        text=np.where(strong, labels, ""),
+        texttemplate="%{text}",
+        textfont=dict(color="white")
+    ))
+    # Update layout with title
+    fig6.update_layout(
+        title="Correlation Between Credit and Money Supply Variables"
+    )
+    return fig6
+
+
+# Bubble Chart: Liquidity Measures vs Foreign Assets
+def liquidity_bubble(filtered_df):
+    import plotly.express as px
+
+    bubble_df = filtered_df.assign(Month=filtered_df.index.strftime('%B'))
+
+    fig7 = px.scatter(
+        bubble_df,
+        x="m2b",
+        y="nfa_monetary_authorities",
+        size="ncg_central_bank",
+        color="Month",  # color by Year instead of Date
+        title="Liquidity Measures and Foreign Assets",
+        labels={
+            "m2b": "Broad Money (M2b) (Rs. Mn)",
+            "nfa_monetary_authorities": "Net Foreign Assets (Rs. Mn)",
+            "ncg_central_bank": "Credit to Government (Rs. Mn)",
+            "Month": "Month"
+        }
+    )
+    fig7.update_layout(
+        xaxis_title="Broad Money (M2b) (Rs. Mn)",
+        yaxis_title="Net Foreign Assets of Monetary Authorities (Rs. Mn)"
+    )
+    return fig7
+
+
+# Area Chart: Liquidity Ratios Over Time (ratios: the precomputed liquidity
+# ratio columns of the view)
+def liquidity_ratios(ratios):
+    import plotly.express as px
+
+    liquidity_df = downsample(ratios, list(RATIO_LABELS)).rename(columns=RATIO_LABELS).reset_index()
+
+    # Melt the ratios into long format
+    liquidity_melted = liquidity_df.melt(
+        id_vars=["Date"],
+        value_vars=["Currency Ratio", "Reserve Money Ratio", "Money Multiplier", "Deposit Ratio"],
+        var_name="Liquidity Ratio",
+        value_name="Value"
+    )
+
+    # Plot Area Chart
+    fig8 = px.area(
+        liquidity_melted,
+        x="Date",
+        y="Value",
+        color="Liquidity Ratio",
+        title="Liquidity Ratios Over Time"
+    )
+    return fig8
+
+
+# Sunburst Chart: Breakdown of Domestic and Foreign Liquidity
+# Columns summed into each component of the liquidity breakdown
+LIQUIDITY_COMPONENTS = {
+    "Domestic Credit": ["ncg_central_bank", "ncg_commercial_banks",
+                        "credit_public_corporations", "credit_private_sector"],
+    "Foreign Assets": ["nfa_monetary_authorities", "nfa_commercial_banks"],
+}
+
+
+# Leaf rows of the Domestic/Foreign liquidity hierarchy, summed up front so
+# that a hierarchy chart gets a handful of rows whatever the view's length:
+# one per (Liquidity Type, Liquidity Component) present, in the order Plotly
+# would list them for the long format (components, then types by first
+# appearance). A row is Foreign when its monetary authorities' NFA is positive
+def liquidity_hierarchy(filtered_df):
+    foreign = filtered_df["nfa_monetary_authorities"].to_numpy(dtype=float) > 0
+    masks = {"Foreign": foreign, "Domestic": ~foreign}
+    # Types in the order of their first row
+    types = sorted((t for t in masks if masks[t].any()), key=lambda t: masks[t].argmax())
+    leaves = []
+    for component, columns in LIQUIDITY_COMPONENTS.items():
+        # Like the column sums, a row missing any part counts as missing
+        amounts = sum(filtered_df[c].to_numpy(dtype=float) for c in columns)
+        for liquidity_type in types:
+            leaves.append((liquidity_type, component, np.nansum(amounts[masks[liquidity_type]])))
+    return pd.DataFrame(leaves, columns=["Liquidity Type", "Liquidity Component", "Amount"])
+
+
+# Hierarchy chart ("sunburst", "treemap" or "icicle", the Plotly Express
+# function) of the liquidity breakdown, built from the pre-aggregated leaves
+def liquidity_breakdown(filtered_df, chart="sunburst"):
+    import plotly.express as px
+
+    return getattr(px, chart)(
+        liquidity_hierarchy(filtered_df),
+        path=['Liquidity Type', 'Liquidity Component'],  # Hierarchy: Domestic/Foreign -> Credit/Assets
+        values='Amount',  # Values to visualize (amounts)
+        title="Breakdown of Domestic and Foreign Liquidity"
+    )
+
+
+def liquidity_sunburst(filtered_df):
+    return liquidity_breakdown(filtered_df, "sunburst")
+
+
+def liquidity_treemap(filtered_df):
+    return liquidity_breakdown(filtered_df, "treemap")
+
+
+def liquidity_icicle(filtered_df):
+    return liquidity_breakdown(filtered_df, "icicle")
+
+
+# Scatter plot of two variables with a best-fit line; fit is an optional
+# precomputed (slope, intercept)
+def relationship(filtered_df, x_variable, y_variable, fit=None):
+    # Generate scatter plot without trendline (to avoid statsmodels dependency)
+    fig10 = go.Figure()
+
+    fig10.add_trace(go.Scatter(
+        x=filtered_df[x_variable],
+        y=filtered_df[y_variable],
+        mode='markers',
+        marker=dict(
+            size=8,
+            color='blue',
+            opacity=0.7
+        ),
+        name='Data Points'
+    ))
+
+    # Manual calculation of best-fit line using numpy
+    if len(filtered_df) > 1:  # Only calculate if we have enough data points
+        x_values = filtered_df[x_variable].values
+        y_values = filtered_df[y_variable].values
+
+        # Filter out NaN values
+        mask = ~np.isnan(x_values) & ~np.isnan(y_values)
+        x_filtered = x_values[mask]
+        y_filtered = y_values[mask]
+
+        if len(x_filtered) > 1:  # Ensure we still have enough points after filtering
+            # Calculate best fit line
+            if fit is None:
+                slope, intercept = np.polyfit(x_filtered, y_filtered, 1)
+            else:
+                slope, intercept = fit
+
+            # Create x points for the line
+            x_line = np.array([min(x_filtered), max(x_filtered)])
+            y_line = slope * x_line + intercept
+
+            # Add the trendline to plot
+            fig10.add_trace(go.Scatter(
+                x=x_line,
+                y=y_line,
+                mode='lines',
+                line=dict(color='red', dash='dash'),
+                name=f'Trend Line (y = {slope:.4f}x + {intercept:.4f})'
+            ))
+
+    fig10.update_layout(
+        title=f"Relationship Between {LABELS[x_variable]} and {LABELS[y_variable]}",
+        xaxis_title=LABELS[x_variable],
+        yaxis_title=LABELS[y_variable]
+    )
+    return fig10
+
+
+# Line chart of a rolling correlation series
+def rolling_correlation(rolling, x_variable, y_variable, window):
+    fig12 = go.Figure()
+    fig12.add_trace(go.Scatter(x=rolling.index, y=rolling.values, mode='lines', name='Correlation'))
+    fig12.update_layout(
+        title=f"Rolling {window}-Period Correlation",
+        xaxis_title='Date',
+        yaxis_title='Correlation',
+        yaxis_range=[-1, 1]
+    )
+    return fig12
+
+
+# Long-term trend of the annual averages
+# annual_avg: Year plus the yearly mean of m1, m2 and m2b
+def money_supply_trend(annual_avg):
+    # Create a simple visualization for the summary
+    fig11 = go.Figure()
+
+    fig11.add_trace(go.Scatter(x=annual_avg["Year"], y=annual_avg["m1"], mode='lines+markers', name='M1'))
+    fig11.add_trace(go.Scatter(x=annual_avg["Year"], y=annual_avg["m2"], mode='lines+markers', name='M2'))
+    fig11.add_trace(go.Scatter(x=annual_avg["Year"], y=annual_avg["m2b"], mode='lines+markers', name='M2b'))
+
+    # Add annotations for major events (replace with actual years/events)
+    if 2008 in annual_avg['Year'].values:
+        fig11.add_annotation(
+            x=2008,
+            y=annual_avg.loc[annual_avg['Year'] == 2008, "m2"].values[0],
+            text="2008 Crisis",
+            showarrow=True,
+            arrowhead=1
+        )
+
+    if 2019 in annual_avg['Year'].values:
+        fig11.add_annotation(
+            x=2019,
+            y=annual_avg.loc[annual_avg['Year'] == 2019, "m2"].values[0],
+            text="2019 Crisis",
+            showarrow=True,
+            arrowhead=1
+        )
+
+    fig11.update_layout(
+        title='Long-Term Money Supply Trends (Annual Averages)',
+        xaxis_title='Year',
+        yaxis_title='Money Supply (Rs. Mn)',
+        legend_title='Money Supply Measures'
+    )
+    return fig11
+
+
+# Range buttons over the date axis in browser filtering mode
+RANGE_BUTTONS = [
+    dict(count=1, label="1y", step="year", stepmode="backward"),
+    dict(count=5, label="5y", step="year", stepmode="backward"),
+    dict(count=10, label="10y", step="year", stepmode="backward"),
+    dict(count=1, label="YTD", step="year", stepmode="todate"),
+    dict(label="All", step="all"),
+]
+
+# Charts over time that get range controls in browser filtering mode, and
+# whether their x axis holds dates (the annual trend's holds year numbers)
+RANGE_CHARTS = {
+    "money_supply_lines": True,
+    "money_supply_bars": True,
+    "credit_vs_m2": True,
+    "credit_lines": True,
+    "liquidity_ratios": True,
+    "rolling_correlation": True,
+    "money_supply_trend": False,
+}
+
+
+# Add a range slider under the x axis, plus range buttons on a date axis.
+# Picking a range then re-slices the chart in the browser without a rerun,
+# and uirevision keeps the picked range when the same figure is redrawn
+def with_range_controls(fig, dates=True):
+    fig.update_xaxes(rangeslider_visible=True)
+    if dates:
+        fig.update_xaxes(rangeselector=dict(buttons=RANGE_BUTTONS))
+    fig.update_layout(uirevision="range")
+    return fig
+
+
+# Chart builders by chart id
+CHARTS = {
+    "money_supply_lines": money_supply_lines,
+    "money_supply_bars": money_supply_bars,
+    "money_supply_pie": money_supply_pie,
+    "credit_vs_m2": credit_vs_m2,
+    "credit_lines": credit_lines,
+    "credit_correlation": credit_correlation,
+    "liquidity_bubble": liquidity_bubble,
+    "liquidity_ratios": liquidity_ratios,
+    "liquidity_sunburst": liquidity_sunburst,
+    "liquidity_treemap": liquidity_treemap,
+    "liquidity_icicle": liquidity_icicle,
+    "relationship": relationship,
+    "money_supply_trend": money_supply_trend,
+}
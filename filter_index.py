@@ -0,0 +1,95 @@
+import calendar
+
+import numpy as np
+import pandas as pd
+
+QUARTERS = {'Q1': 1, 'Q2': 2, 'Q3': 3, 'Q4': 4}
+MONTH_NUMBERS = {name: number for number, name in enumerate(calendar.month_name) if name}
+
+
+# Canonical form of a selection, so that equivalent selections share
+# cache entries (a month already implies its quarter)
+def normalize_selection(year='All', quarter='All', month='All'):
+    if quarter != 'All' and month != 'All':
+        if (MONTH_NUMBERS[month] - 1) // 3 + 1 == QUARTERS[quarter]:
+            quarter = 'All'
+    return (year, quarter, month)
+
+
+# Year/quarter/month -> row positions for a date-sorted frame. Built once at
+# load time so that a filter selection resolves to a slice or a precomputed
+# integer take instead of a chain of boolean masks over a copied frame
+class FilterIndex:
+    def __init__(self, dates):
+        dates = pd.DatetimeIndex(dates)
+        if not dates.is_monotonic_increasing:
+            raise ValueError("FilterIndex needs the dates sorted in ascending order")
+
+        months = dates.month.to_numpy()
+        quarters = (months - 1) // 3 + 1
+        self.length = len(dates)
+        self.years = sorted(dates.year.unique().tolist())
+        self.month_names = list(dates.month_name().unique())
+
+        # year * 12 + month - 1 grows with the dates, so any one year,
+        # year + quarter or year + month selection is a contiguous run of rows
+        self.period_keys = dates.year.to_numpy() * 12 + months - 1
+
+        # Across all years a quarter or month is scattered, so keep its rows
+        self.quarter_positions = {q: np.flatnonzero(quarters == q) for q in range(1, 5)}
+        self.month_positions = {m: np.flatnonzero(months == m) for m in range(1, 13)}
+
+    # Returns a slice when the rows are contiguous, otherwise an array of
+    # row positions
+    def resolve(self, year='All', quarter='All', month='All'):
+        quarter_no = None if quarter == 'All' else QUARTERS[quarter]
+        month_no = None if month == 'All' else MONTH_NUMBERS[month]
+        if quarter_no and month_no and (month_no - 1) // 3 + 1 != quarter_no:
+            return slice(0, 0)
+
+        if year != 'All':
+            if month_no:
+                first, last = month_no, month_no
+            elif quarter_no:
+                first, last = 3 * quarter_no - 2, 3 * quarter_no
+            else:
+                first, last = 1, 12
+            start = np.searchsorted(self.period_keys, year * 12 + first - 1, side='left')
+            stop = np.searchsorted(self.period_keys, year * 12 + last - 1, side='right')
+            return slice(int(start), int(stop))
+
+        if month_no:
+            return self.month_positions[month_no]
+        if quarter_no:
+            return self.quarter_positions[quarter_no]
+        return slice(0, self.length)
+
+    def normalize(self, year='All', quarter='All', month='All'):
+        return normalize_selection(year, quarter, month)
+
+    # Whether a selection includes any row at or after position start (used to
+    # tell which selections an append has changed)
+    def reaches(self, start, year='All', quarter='All', month='All'):
+        rows = self.resolve(year, quarter, month)
+        if isinstance(rows, slice):
+            return rows.start < rows.stop and rows.stop > start
+        return len(rows) > 0 and rows[-1] >= start
+
+    # Every distinct normalized selection that can match rows; a month
+    # outside the chosen quarter never does, so those are left out
+    def selections(self):
+        keys = {}
+        for year in ['All'] + self.years:
+            for quarter in ['All'] + list(QUARTERS):
+                for month in ['All'] + self.month_names:
+                    key = self.normalize(year, quarter, month)
+                    if key[1] == 'All' or key[2] == 'All':
+                        keys[key] = None
+        return list(keys)
+
+    # Rows of df (aligned with the indexed dates) for a selection
+    def select(self, df, year='All', quarter='All', month='All'):
+        rows = self.resolve(year, quarter, month)
+        if isinstance(rows, slice):
+            return df.iloc[rows]
+        return df.take(rows)
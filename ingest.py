@@ -0,0 +1,165 @@
+import argparse
+import datetime
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+import data_store
+from data_store import COLUMNS, normalize_header
+
+# Raw CBSL table first, then the cleaned export, which wins where they overlap
+WORKBOOKS = [
+    os.path.join(data_store.BASE_DIR, "Monetary_stats_1995-2023.xlsx"),
+    os.path.join(data_store.BASE_DIR, "monetaryexcel.xlsx"),
+]
+
+# Month labels used in place of dates, e.g. "Apr-23(g)" or "Dec-24 (i)"
+MONTH_LABEL = re.compile(r"^([A-Za-z]{3})-(\d{2}|\d{4})\b")
+# Footnote markers on values, e.g. "1,803,088 (h)"
+FOOTNOTE = re.compile(r"\(\w\)")
+
+
+# Timestamp for a date cell (the first of the month for a month label), or
+# None for anything else (units, footnote markers, notes)
+def parse_date(value):
+    if isinstance(value, datetime.datetime):
+        return pd.Timestamp(value).normalize()
+    if isinstance(value, str):
+        match = MONTH_LABEL.match(value.strip())
+        if match:
+            year_format = "%y" if len(match.group(2)) == 2 else "%Y"
+            try:
+                return pd.Timestamp(datetime.datetime.strptime(
+                    f"{match.group(1)}-{match.group(2)}", f"%b-{year_format}"))
+            except ValueError:
+                return None
+    return None
+
+
+def parse_number(value):
+    if isinstance(value, str):
+        value = FOOTNOTE.sub("", value).replace(",", "").strip()
+    return value
+
+
+def sheet_names(path):
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+# Read one sheet with openpyxl's streaming read-only reader. The header row is
+# the first row naming at least two known series; the dates are in the
+# "Date" column, or else the first column left of the series holding one.
+# Returns (path, sheet, frame or None, seconds)
+def read_sheet(path, sheet):
+    start = time.perf_counter()
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet].iter_rows(values_only=True)
+        header = None
+        for row in rows:
+            names = [normalize_header(cell) if cell is not None else None for cell in row]
+            if sum(name in COLUMNS for name in names) >= 2:
+                header = names
+                break
+        if header is None:
+            return path, sheet, None, time.perf_counter() - start
+
+        series = {i: COLUMNS[name] for i, name in enumerate(header) if name in COLUMNS}
+        date_column = header.index("Date") if "Date" in header else None
+        dates = []
+        records = []
+        for row in rows:
+            if date_column is None:
+                for i in range(min(series)):
+                    if parse_date(row[i]) is not None:
+                        date_column = i
+                        break
+                else:
+                    continue
+            date = parse_date(row[date_column])
+            if date is not None:
+                dates.append(date)
+                records.append([parse_number(row[i]) for i in series])
+    finally:
+        workbook.close()
+
+    df = pd.DataFrame(records, columns=list(series.values()),
+                      index=pd.DatetimeIndex(dates, name="Date").astype("datetime64[ns]"))
+    df = df.apply(pd.to_numeric, errors="coerce")
+    return path, sheet, df, time.perf_counter() - start
+
+
+# Combine sheets in the order given, matching rows by month (sheets date the
+# same month differently): months repeated within a sheet are dropped (the
+# last one kept), and later sheets win for months that several cover.
+# Returns the frame and counts of overlapping and conflicting months
+def reconcile(frames):
+    frames = [df[~df.index.to_period("M").duplicated(keep="last")] for df in frames]
+    combined = pd.concat(frames)
+    months = combined.index.to_period("M")
+    overlaps = months.duplicated(keep=False)
+    # Months where the sources disagree by more than rounding to whole millions
+    spread = combined[overlaps].groupby(months[overlaps]).agg(lambda s: s.max() - s.min())
+    conflicts = int((spread >= 1).any(axis=1).sum())
+
+    combined = combined[~months.duplicated(keep="last")].sort_index()
+    combined = combined[[c for c in COLUMNS.values() if c in combined.columns]]
+    # Keep whole-number series as integers, like the CSV export
+    for name in combined.columns:
+        values = combined[name]
+        if values.notna().all() and (values % 1 == 0).all():
+            combined[name] = values.astype("int64")
+    return combined, int(months[overlaps].nunique()), conflicts
+
+
+# Months missing between the first and last date
+def missing_months(dates):
+    periods = dates.year.to_numpy() * 12 + dates.month.to_numpy() - 1
+    return int((np.diff(periods) - 1).clip(min=0).sum())
+
+
+# Read every sheet of the workbooks in a process pool and write the
+# reconciled series to the store. Returns the frame and (path, sheet, rows,
+# seconds) per sheet
+def ingest(workbooks=WORKBOOKS, path=data_store.STORE_PATH, workers=None):
+    tasks = [(workbook, sheet) for workbook in workbooks for sheet in sheet_names(workbook)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(read_sheet, *zip(*tasks)))
+
+    frames = [df for _, _, df, _ in results if df is not None and not df.empty]
+    if not frames:
+        raise ValueError("No sheet with monetary series found")
+    df, overlapping, conflicts = reconcile(frames)
+    data_store.write_store(df, path, ", ".join(os.path.basename(w) for w in workbooks))
+
+    timings = [(workbook, sheet, 0 if sheet_df is None else len(sheet_df), seconds)
+               for workbook, sheet, sheet_df, seconds in results]
+    return df, timings, overlapping, conflicts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest CBSL monetary workbooks into the data store")
+    parser.add_argument("workbooks", nargs="*", default=WORKBOOKS,
+                        help="XLSX files, later ones winning where months overlap")
+    parser.add_argument("--store", default=data_store.STORE_PATH, help="output Arrow file")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df, timings, overlapping, conflicts = ingest(args.workbooks, args.store, args.workers)
+    for workbook, sheet, rows, seconds in timings:
+        status = f"{rows} rows" if rows else "skipped (no series)"
+        print(f"{os.path.basename(workbook)} [{sheet}]: {status} in {seconds:.3f}s")
+    print(f"{overlapping} overlapping months, {conflicts} with differing values "
+          f"(later workbook kept), {missing_months(df.index)} months missing")
+    print(f"Wrote {len(df)} rows x {df.shape[1]} series to {args.store} "
+          f"in {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,67 @@
+import argparse
+import os
+
+import numpy as np
+
+# Compact figure payloads (on unless DASHBOARD_COMPACT_PAYLOADS=0)
+COMPACT_PAYLOADS = os.environ.get("DASHBOARD_COMPACT_PAYLOADS", "1") != "0"
+
+
+# Send datetime arrays as float64 epoch milliseconds, which Plotly's date
+# axes take as they are. Like the numeric arrays, they then serialize as one
+# typed binary array per trace instead of a JSON list of ISO strings. The
+# axis is marked as a date axis so the numbers aren't drawn on a linear scale
+def compact(fig):
+    for trace in fig.data:
+        for attr in ("x", "y"):
+            if attr not in trace:
+                continue
+            values = trace[attr]
+            if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+                missing = np.isnat(values)
+                millis = values.astype("datetime64[ms]").astype("int64").astype(float)
+                millis[missing] = np.nan
+                trace[attr] = millis
+                axis = trace[attr + "axis"] or attr
+                fig.layout[axis.replace(attr, attr + "axis", 1)].type = "date"
+    return fig
+
+
+# Figure JSON as sent to the browser
+def to_json(fig):
+    if COMPACT_PAYLOADS:
+        fig = compact(fig)
+    return fig.to_json()
+
+
+# Bytes per figure for the full dataset, with and without compact payloads
+def report():
+    import data_store
+    import figures
+    from analytics import RATIO_LABELS
+
+    dataset = data_store.Dataset.open(data_store.ensure_store())
+    frame = dataset.frame
+    annual_avg = dataset.rollups.yearly("mean")[["m1", "m2", "m2b"]].reset_index()
+    pair_fit = dataset.pair_stats.fit_for(("All", "All", "All"), "m0", "m2")
+    # The inputs dashboard.py and prebuild.py give the charts not drawn from
+    # the frame itself
+    args = {
+        "liquidity_ratios": (dataset.indicator_view(columns=list(RATIO_LABELS)),),
+        "money_supply_trend": (annual_avg,),
+        "relationship": (frame, "m0", "m2", tuple(float(v) for v in pair_fit)),
+    }
+    total_plain = total_compact = 0
+    for chart_id, build in figures.CHARTS.items():
+        chart_args = args.get(chart_id, (frame,))
+        plain = len(build(*chart_args).to_json())
+        small = len(compact(build(*chart_args)).to_json())
+        total_plain += plain
+        total_compact += small
+        print(f"{chart_id:22s} {plain:9,d} B -> {small:9,d} B")
+    print(f"{'total':22s} {total_plain:9,d} B -> {total_compact:9,d} B")
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description="Report figure payload sizes").parse_args()
+    report()
@@ -0,0 +1,279 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import data_store
+import figures
+import payload
+from analytics import RATIO_LABELS
+
+# Static build of the dashboard: every tab's figures, tables and KPI cards
+# for every filter selection, the correlations of every explorer pair, and
+# an HTML page that renders them with plotly.js. Served from disk by any
+# static file server (e.g. python -m http.server -d store/static), nothing
+# is computed per request. Layout of the output directory:
+#   index.html, plotly.min.js   the page
+#   manifest.json               version, source checksum, selection and pair
+#                               bundles (written last, so the page and a
+#                               stale check only ever see a finished build)
+#   <version>/selections/       one JSON bundle per selection
+#   <version>/pairs/            explorer figures of each pair
+STATIC_DIR = os.path.join(os.path.dirname(data_store.STORE_PATH), "static")
+SHELL_PATH = os.path.join(data_store.BASE_DIR, "static", "index.html")
+MANIFEST = "manifest.json"
+# Bump when the bundle layout changes, so older builds count as stale
+FORMAT = 1
+
+YEARLY_SUMMARY = {"m0": "M0", "m1": "M1", "m2": "M2", "m2b": "M2b"}
+
+# Set in each worker process by init_worker()
+dataset = None
+output_dir = None
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(static_dir=STATIC_DIR):
+    try:
+        with open(os.path.join(static_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# The version recorded in the store's metadata, or None when there is no
+# store yet
+def store_version(path=data_store.STORE_PATH):
+    if not os.path.exists(path):
+        return None
+    metadata = data_store.open_table(path).schema.metadata or {}
+    return metadata.get(b"version", b"").decode()
+
+
+# Why the static build needs rebuilding for the source, or None when it is
+# up to date. The store is checked as well as the CSV, since appends and
+# spreadsheet ingests change the data without touching the CSV
+def stale_reason(source=data_store.SOURCE_CSV, static_dir=STATIC_DIR, store=data_store.STORE_PATH):
+    manifest = read_manifest(static_dir)
+    if manifest is None:
+        return "no build yet"
+    if manifest.get("format") != FORMAT:
+        return "built by an older prebuild"
+    if manifest.get("source", {}).get("sha256") != file_sha256(source):
+        return f"{os.path.basename(source)} changed"
+    version = store_version(store)
+    if version is not None and manifest.get("version") != version:
+        return f"{os.path.basename(store)} changed"
+    return None
+
+
+def selection_name(key):
+    return "-".join(str(part) for part in key)
+
+
+def number(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def init_worker(store_path, out_dir):
+    global dataset, output_dir
+    dataset = data_store.Dataset.open(store_path)
+    output_dir = out_dir
+
+
+# KPI cards of a selection as (label, value, delta), formatted like the
+# dashboard's
+def kpi_cards(kpis):
+    growth, growth_date = kpis["peak_m2_growth"]
+    cards = [("Peak M2 Growth (YoY)", f"{0 if math.isnan(growth) else growth:.3f}%",
+              f"in {'N/A' if growth_date is None else growth_date.strftime('%b %Y')}")]
+    for name, label in (("max_m1", "Maximum M1 Value"), ("max_m0", "Maximum M0 Value")):
+        value, date = kpis[name]
+        cards.append((label, f"{value / 1000:.1f}B",
+                      f"in {'N/A' if date is None else date.strftime('%b %Y')}"))
+    return cards
+
+
+# Every selection-level chart, built from the same data as on the
+# dashboard's tabs (the explorer's charts depend on a pair and are built
+# per pair)
+def selection_figures(key, view):
+    annual_avg = dataset.rollups.yearly("mean", *key)[["m1", "m2", "m2b"]].reset_index()
+    inputs = {
+        "liquidity_ratios": lambda: dataset.indicator_view(*key, columns=list(RATIO_LABELS)),
+        "money_supply_trend": lambda: annual_avg,
+    }
+    fig_json = {}
+    for chart_id, build in figures.CHARTS.items():
+        if chart_id == "relationship":
+            continue
+        if chart_id == "credit_correlation":
+            fig = figures.correlation_heatmap(
+                dataset.correlation(list(figures.CORRELATION_COLUMNS), *key))
+        else:
+            fig = build(inputs[chart_id]() if chart_id in inputs else view)
+        fig_json[chart_id] = payload.to_json(fig)
+    return fig_json
+
+
+# Write the bundle of one selection: figures, tables, KPI cards and the
+# statistics of every explorer pair. A selection without rows gets an empty
+# bundle (the page shows that there is no data)
+def build_selection(key):
+    view = dataset.view(*key)
+    bundle = {"selection": list(key), "rows": len(view)}
+    fig_json = {}
+    if len(view):
+        fig_json = selection_figures(key, view)
+        yearly = dataset.rollups.yearly("sum", *key)[list(YEARLY_SUMMARY)]
+        yearly = yearly.rename(columns=YEARLY_SUMMARY).reset_index()
+        bundle["tables"] = {"yearly_summary": json.loads(yearly.to_json(orient="split", index=False))}
+        bundle["kpis"] = kpi_cards(dataset.kpis(*key))
+        bundle["pairs"] = pair_statistics(key)
+
+    # The figure JSON is spliced in as it is rather than parsed and dumped again
+    body = json.dumps(bundle)[:-1] + ', "figures": {'
+    body += ", ".join(f"{json.dumps(chart_id)}: {text}" for chart_id, text in fig_json.items())
+    body += "}}"
+    path = f"selections/{selection_name(key)}.json"
+    with open(os.path.join(output_dir, path), "w", encoding="utf-8") as f:
+        f.write(body)
+    return key, path, len(body)
+
+
+# Pearson, Spearman, latest rolling correlation and best-fit line per pair
+def pair_statistics(key):
+    stats = dataset.pair_stats
+    pairs = {}
+    for x in figures.AVAILABLE_VARIABLES:
+        for y in figures.AVAILABLE_VARIABLES:
+            slope, intercept = stats.fit_for(key, x, y)
+            rolling = stats.rolling_for(key, x, y).dropna()
+            pairs[f"{x}|{y}"] = {
+                "pearson": number(stats.pearson_for(key, x, y)),
+                "spearman": number(stats.spearman_for(key, x, y)),
+                "rolling": number(rolling.iloc[-1]) if len(rolling) else None,
+                "slope": number(slope),
+                "intercept": number(intercept),
+            }
+    return pairs
+
+
+# Explorer figures of a pair over the full history: the scatter with its
+# best-fit line and the rolling correlation
+def build_pair(x, y):
+    key = ("All", "All", "All")
+    stats = dataset.pair_stats
+    fit = tuple(float(v) for v in stats.fit_for(key, x, y))
+    rolling = stats.rolling_for(key, x, y)
+    body = '{"relationship": %s, "rolling_correlation": %s}' % (
+        payload.to_json(figures.relationship(dataset.view(), x, y, fit)),
+        payload.to_json(figures.rolling_correlation(rolling, x, y, stats.window)),
+    )
+    path = f"pairs/{x}__{y}.json"
+    with open(os.path.join(output_dir, path), "w", encoding="utf-8") as f:
+        f.write(body)
+    return f"{x}|{y}", path, len(body)
+
+
+# Render every selection and pair in a process pool and switch the output
+# directory's manifest to the new build. The workers memory-map the store
+# and the derived arrays published for it, rather than each deriving its
+# own. The previous build is kept for pages still loading from it
+def prebuild(source=data_store.SOURCE_CSV, static_dir=STATIC_DIR, workers=None):
+    store_path = data_store.ensure_store(source)
+    parent = data_store.Dataset.open(store_path)
+    data_store.publish_derived(parent)
+
+    version = parent.version or str(time.time_ns())
+    target = os.path.join(static_dir, version)
+    tmp_dir = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    for name in ("selections", "pairs"):
+        os.makedirs(os.path.join(tmp_dir, name))
+
+    keys = parent.filter_index.selections()
+    pairs = [(x, y) for x in figures.AVAILABLE_VARIABLES for y in figures.AVAILABLE_VARIABLES]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(store_path, tmp_dir)) as pool:
+        selections = list(pool.map(build_selection, keys, chunksize=8))
+        pair_files = list(pool.map(build_pair, *zip(*pairs), chunksize=8))
+
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.replace(tmp_dir, target)
+    shutil.copyfile(SHELL_PATH, os.path.join(static_dir, "index.html"))
+    import plotly
+    plotly_js = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+    shutil.copyfile(plotly_js, os.path.join(static_dir, "plotly.min.js"))
+
+    previous = read_manifest(static_dir)
+    manifest = {
+        "format": FORMAT,
+        "version": version,
+        "built_at": time.time(),
+        "source": {"name": os.path.basename(source), "sha256": file_sha256(source)},
+        "years": parent.years,
+        "month_names": parent.month_names,
+        "variables": {name: data_store.LABELS[name] for name in figures.AVAILABLE_VARIABLES},
+        "selections": {selection_name(key): f"{version}/{path}" for key, path, _ in selections},
+        "pairs": {pair: f"{version}/{path}" for pair, path, _ in pair_files},
+        "bytes": sum(size for *_, size in selections + pair_files),
+    }
+    tmp_manifest = os.path.join(static_dir, f"{MANIFEST}.{os.getpid()}.tmp")
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, os.path.join(static_dir, MANIFEST))
+
+    kept = (version, previous and previous.get("version"))
+    for name in os.listdir(static_dir):
+        path = os.path.join(static_dir, name)
+        if os.path.isdir(path) and name not in kept and not name.endswith(".tmp"):
+            shutil.rmtree(path, ignore_errors=True)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prebuild the dashboard as static JSON bundles and an HTML page")
+    parser.add_argument("--source", default=data_store.SOURCE_CSV, help="cleaned CSV or XLSX export")
+    parser.add_argument("--output", default=STATIC_DIR, help="static output directory")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the build is up to date")
+    parser.add_argument("--check", action="store_true",
+                        help="only report whether the build is stale (exit status 1 if it is)")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="keep checking the source and store every SECONDS and rebuild when they change")
+    args = parser.parse_args()
+
+    if args.check:
+        reason = stale_reason(args.source, args.output)
+        print(f"Stale: {reason}" if reason else "Up to date")
+        raise SystemExit(1 if reason else 0)
+
+    force = args.force
+    while True:
+        reason = "forced" if force else stale_reason(args.source, args.output)
+        if reason:
+            start = time.perf_counter()
+            manifest = prebuild(args.source, args.output, args.workers)
+            print(f"Rebuilt ({reason}): {len(manifest['selections'])} selections, "
+                  f"{len(manifest['pairs'])} pairs, {manifest['bytes'] / 2**20:.1f} MB "
+                  f"in {time.perf_counter() - start:.1f}s -> {args.output}")
+        elif not args.watch:
+            print("Up to date")
+        if not args.watch:
+            break
+        force = False
+        time.sleep(args.watch)
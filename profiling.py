@@ -0,0 +1,174 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Profile every rerun with DASHBOARD_PROFILE=1 (a session can also turn it on
+# with ?profile=1, for wall times only: allocations are traced only when
+# profiling is on for the process); DASHBOARD_PROFILE_LOG appends each
+# rerun's spans to a JSON lines file
+ENABLED = os.environ.get("DASHBOARD_PROFILE", "0") != "0"
+LOG_PATH = os.environ.get("DASHBOARD_PROFILE_LOG")
+
+# The trace of the rerun running on this thread (None when not profiling)
+class TraceLocal(threading.local):
+    trace = None
+
+
+_local = TraceLocal()
+
+# Per span name, over every profiled rerun of the process: [calls, seconds]
+totals = {}
+totals_lock = threading.Lock()
+
+
+# Spans of one rerun, in the order they started. Each span is a dict with
+# its name (the names of the spans it is nested in joined by "/"), depth,
+# wall time in ms and net allocated KiB (when tracing allocations), plus
+# anything the caller adds
+# (e.g. cache hit or miss)
+class Trace:
+    def __init__(self):
+        self.started = time.time()
+        self.spans = []
+        self.path = []
+
+
+class Span:
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.record = {"name": "/".join(trace.path + [name]), "depth": len(trace.path)}
+        self.label = name
+
+    def __enter__(self):
+        self.trace.spans.append(self.record)
+        self.trace.path.append(self.label)
+        self.allocated = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        self.record["ms"] = seconds * 1000
+        if self.allocated is not None and tracemalloc.is_tracing():
+            self.record["alloc_kb"] = (tracemalloc.get_traced_memory()[0] - self.allocated) / 1024
+        self.trace.path.pop()
+        with totals_lock:
+            calls = totals.setdefault(self.record["name"], [0, 0.0])
+            calls[0] += 1
+            calls[1] += seconds
+        return False
+
+
+# Stand-in when not profiling: one shared object, so a disabled span costs a
+# thread-local lookup and an empty dict (the block's own record, which it
+# can write to and nothing reads)
+class NoSpan:
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_SPAN = NoSpan()
+
+
+# Start profiling the rerun on this thread (or stop, if not enabled).
+# tracemalloc slows down every thread of the process while it runs, so
+# allocations are traced only when profiling is on for the whole process,
+# never because one session asked for a profile
+def start_trace(enabled=ENABLED):
+    _local.trace = Trace() if enabled else None
+    if enabled and ENABLED and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return _local.trace
+
+
+# Context manager timing a block of the current rerun; `with span(...) as
+# record` lets the block add fields to its record
+def span(name):
+    trace = _local.trace
+    if trace is None:
+        return NO_SPAN
+    return Span(trace, name)
+
+
+# Span of a fragment: nested in the trace of a full rerun, or the root of a
+# trace of its own when only the fragment reruns
+@contextlib.contextmanager
+def fragment_span(name, enabled=ENABLED):
+    if _local.trace is not None or not enabled:
+        with span(name) as record:
+            yield record
+        return
+    with rerun_trace(True):
+        with span(name) as record:
+            yield record
+
+
+# Trace of a whole rerun, ended however the rerun ends: Streamlit stops a
+# script that is interrupted by another rerun (or st.stop, or an error) by
+# raising out of it, and a trace left behind would take in the spans of a
+# later fragment rerun on the same thread
+@contextlib.contextmanager
+def rerun_trace(enabled=ENABLED):
+    trace = start_trace(enabled)
+    try:
+        yield trace
+    finally:
+        finish_trace()
+
+
+# End the rerun's trace, appending it to the log file if there is one
+def finish_trace():
+    trace = _local.trace
+    _local.trace = None
+    if trace is not None and LOG_PATH:
+        with open(LOG_PATH, "a", encoding="utf-8") as log:
+            log.write(to_json_lines(trace))
+    return trace
+
+
+# One JSON object per span, tagged with the rerun's start time
+def to_json_lines(trace):
+    return "".join(json.dumps(dict(record, rerun=trace.started)) + "\n" for record in trace.spans)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# OpenMetrics text for the process: calls and seconds per span name, and
+# the figure cache's counters when given FigureCache.stats()
+def to_openmetrics(cache_stats=None):
+    lines = [
+        "# TYPE dashboard_span_calls counter",
+        "# HELP dashboard_span_calls Profiled executions of a dashboard step.",
+    ]
+    with totals_lock:
+        snapshot = sorted(totals.items())
+    for name, (calls, _) in snapshot:
+        lines.append(f'dashboard_span_calls_total{{span="{escape_label(name)}"}} {calls}')
+    lines += [
+        "# TYPE dashboard_span_seconds counter",
+        "# UNIT dashboard_span_seconds seconds",
+        "# HELP dashboard_span_seconds Wall time spent in a dashboard step.",
+    ]
+    for name, (_, seconds) in snapshot:
+        lines.append(f'dashboard_span_seconds_total{{span="{escape_label(name)}"}} {seconds:.6f}')
+    if cache_stats is not None:
+        lines += [
+            "# TYPE dashboard_figure_cache_requests counter",
+            "# HELP dashboard_figure_cache_requests Figure cache lookups by result.",
+            f'dashboard_figure_cache_requests_total{{result="hit"}} {cache_stats["hits"]}',
+            f'dashboard_figure_cache_requests_total{{result="miss"}} {cache_stats["misses"]}',
+            "# TYPE dashboard_figure_cache_bytes gauge",
+            "# UNIT dashboard_figure_cache_bytes bytes",
+            "# HELP dashboard_figure_cache_bytes Size of the cached figure JSON.",
+            f'dashboard_figure_cache_bytes {cache_stats["bytes"]}',
+        ]
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,224 @@
+import numpy as np
+import pandas as pd
+
+from filter_index import MONTH_NUMBERS, QUARTERS
+
+GRAINS = ("year", "quarter", "month")
+STATS = ("sum", "mean", "min", "max", "argmax", "growth")
+
+
+# Rollup cube of every series: sum, mean, min, max, argmax (date of the
+# maximum) and growth (% change of the mean on the previous period) per year,
+# quarter and month, plus totals and the peak row-to-row growth for every
+# filter selection. Built once when the dataset is loaded so that summary
+# tables and KPI cards are lookups instead of groupbys over the view. Given
+# the cube of a parent dataset that this frame extends with appended rows,
+# only the periods and selections those rows reach are recomputed.
+class RollupCube:
+    def __init__(self, frame, filter_index, parent=None, values=None):
+        self.columns = list(frame.columns)
+        self.filter_index = filter_index
+        self.dates = frame.index
+        if values is None:
+            values = frame.to_numpy(dtype=float)
+        start = 0 if parent is None else len(parent.dates)
+
+        keys = filter_index.period_keys
+        years = keys // 12
+        months = keys % 12 + 1
+        quarters = (months - 1) // 3 + 1
+        grains = {
+            "year": ([years], ["Year"]),
+            "quarter": ([years, quarters], ["Year", "Quarter"]),
+            "month": ([years, months], ["Year", "Month"]),
+        }
+        self.tables = {}
+        for grain, (groups, names) in grains.items():
+            previous = None if parent is None else parent.tables[grain]
+            self.tables[grain] = self._rollup(values, groups, names, previous, start)
+
+        # Per-year tables for each quarter / month choice of the sidebar,
+        # cut from the quarter and month tables on first use
+        self.yearly_tables = {('All', 'All'): self.tables["year"]}
+
+        self.selections = {}
+        for key in filter_index.selections():
+            rows = filter_index.resolve(*key)
+            if parent is None or key not in parent.selections:
+                self.selections[key] = self._summarize(values, rows)
+            elif filter_index.reaches(start, *key):
+                self.selections[key] = self._extend_summary(parent.selections[key], values, rows, start)
+            else:
+                self.selections[key] = parent.selections[key]
+
+    # One table per stat, indexed by period. Rows of a period are contiguous
+    # in the date-sorted frame, so each stat is a single reduceat. With the
+    # previous tables, only the periods from the one holding row start on
+    # are summed
+    def _rollup(self, values, groups, names, previous=None, start=0):
+        group_keys = np.stack(groups, axis=1)
+        first = 0
+        if previous is not None:
+            first = start
+            while first > 0 and (group_keys[first - 1] == group_keys[start]).all():
+                first -= 1
+        group_keys = group_keys[first:]
+        values = values[first:]
+
+        changed = np.r_[True, (group_keys[1:] != group_keys[:-1]).any(axis=1)]
+        starts = np.flatnonzero(changed)
+        lengths = np.diff(np.r_[starts, len(values)])
+        if len(names) == 1:
+            index = pd.Index(group_keys[starts, 0], name=names[0])
+        else:
+            index = pd.MultiIndex.from_arrays(list(group_keys[starts].T), names=names)
+
+        valid = ~np.isnan(values)
+        count = np.add.reduceat(valid.astype(int), starts)
+        total = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+        minimum = np.fmin.reduceat(values, starts)
+        maximum = np.fmax.reduceat(values, starts)
+
+        # First row of each period holding its maximum
+        rows = np.arange(len(values))[:, None]
+        at_max = values == np.repeat(maximum, lengths, axis=0)
+        first_max = np.minimum.reduceat(np.where(at_max, rows, len(values)), starts)
+        argmax = {}
+        for i, name in enumerate(self.columns):
+            dates = np.full(len(starts), np.datetime64("NaT"), dtype=self.dates.dtype)
+            found = first_max[:, i] < len(values)
+            dates[found] = self.dates.values[first + first_max[found, i]]
+            argmax[name] = dates
+
+        stats = {"sum": total, "mean": mean, "min": minimum, "max": maximum}
+        tables = {stat: pd.DataFrame(data, index=index, columns=self.columns)
+                  for stat, data in stats.items()}
+        tables["argmax"] = pd.DataFrame(argmax, index=index)
+        if previous is not None:
+            # Drop the parent's last period when the new rows continue it
+            kept = len(previous["sum"]) - (first < start)
+            tables = {stat: pd.concat([previous[stat].iloc[:kept], table])
+                      for stat, table in tables.items()}
+
+        mean = tables["mean"].to_numpy()
+        growth = np.full_like(mean, np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            growth[1:] = (mean[1:] / mean[:-1] - 1) * 100
+        tables["growth"] = pd.DataFrame(growth, index=tables["mean"].index, columns=self.columns)
+        return tables
+
+    # Whole-selection figures, with growth taken between consecutive rows of
+    # the selection like pct_change() on the filtered view
+    def _summarize(self, values, rows):
+        values = values[rows]
+        dates = self.dates.values[rows]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            growth = (values[1:] / values[:-1] - 1) * 100
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        total = np.where(valid, values, 0.0).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+        summary = {
+            "count": count,
+            "sum": np.where(count > 0, total, np.nan),
+            "mean": mean,
+            "min": np.where(count > 0, np.fmin.reduce(values, axis=0, initial=np.inf), np.nan),
+        }
+        summary["max"], summary["argmax"] = self._peak(values, dates)
+        summary["peak_growth"], summary["peak_growth_date"] = self._peak(growth, dates[1:])
+        return summary
+
+    # A parent selection's figures merged with those of its appended rows and
+    # the growth step from its last old row to the first new one
+    def _extend_summary(self, summary, values, rows, start):
+        if isinstance(rows, slice):
+            last_old = start - 1 if rows.start < start else None
+            new_rows = slice(max(rows.start, start), rows.stop)
+            first_new = new_rows.start
+        else:
+            split = np.searchsorted(rows, start)
+            last_old = rows[split - 1] if split else None
+            new_rows = rows[split:]
+            first_new = new_rows[0]
+        tail = self._summarize(values, new_rows)
+        if last_old is None:
+            return tail
+
+        count = summary["count"] + tail["count"]
+        total = np.where(np.isnan(summary["sum"]), 0.0, summary["sum"]) + np.where(np.isnan(tail["sum"]), 0.0, tail["sum"])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            step = (values[first_new] / values[last_old] - 1) * 100
+        merged = {
+            "count": count,
+            "sum": np.where(count > 0, total, np.nan),
+            "mean": np.where(count > 0, total / np.maximum(count, 1), np.nan),
+            "min": np.fmin(summary["min"], tail["min"]),
+        }
+        # Earlier rows win ties, as with idxmax on the view
+        peak_dates = np.full(len(step), self.dates.values[first_new])
+        merged["max"], merged["argmax"] = self._later_peak(
+            (summary["max"], summary["argmax"]), (tail["max"], tail["argmax"]))
+        merged["peak_growth"], merged["peak_growth_date"] = self._later_peak(
+            (summary["peak_growth"], summary["peak_growth_date"]), (step, peak_dates),
+            (tail["peak_growth"], tail["peak_growth_date"]))
+        return merged
+
+    # Elementwise maximum (and its date) over candidates in row order
+    def _later_peak(self, *candidates):
+        peak, dates = candidates[0]
+        peak, dates = peak.copy(), dates.copy()
+        for values, value_dates in candidates[1:]:
+            better = (values > peak) | (np.isnan(peak) & ~np.isnan(values))
+            peak[better] = values[better]
+            dates[better] = value_dates[better]
+        return peak, dates
+
+    # Column maxima and the date of the first row holding each (NaN / NaT for
+    # columns with no values)
+    def _peak(self, values, dates):
+        found = (~np.isnan(values)).any(axis=0)
+        peak = np.full(values.shape[1], np.nan)
+        peak_dates = np.full(values.shape[1], np.datetime64("NaT"), dtype=self.dates.dtype)
+        if found.any():
+            first = np.where(np.isnan(values), -np.inf, values).argmax(axis=0)
+            peak[found] = values[first, np.arange(values.shape[1])][found]
+            peak_dates[found] = dates[first[found]]
+        return peak, peak_dates
+
+    # Per-year rows of a stat for a selection: the year table, or the quarter
+    # or month table narrowed to the selected quarter or month
+    def yearly(self, stat, year='All', quarter='All', month='All'):
+        year, quarter, month = self.filter_index.normalize(year, quarter, month)
+        if quarter != 'All' and month != 'All':
+            # A month outside the selected quarter
+            return self.tables["year"][stat].iloc[:0]
+        table = self._yearly_tables(quarter, month)[stat]
+        if year != 'All':
+            table = table[table.index == year]
+        return table
+
+    def _yearly_tables(self, quarter, month):
+        tables = self.yearly_tables.get((quarter, month))
+        if tables is None:
+            if month != 'All':
+                grain, level, number = "month", "Month", MONTH_NUMBERS[month]
+            else:
+                grain, level, number = "quarter", "Quarter", QUARTERS[quarter]
+            index = self.tables[grain]["sum"].index
+            rows = np.flatnonzero(index.get_level_values(level) == number)
+            years = index.get_level_values("Year")[rows]
+            tables = {stat: table.iloc[rows].set_axis(years)
+                      for stat, table in self.tables[grain].items()}
+            self.yearly_tables[(quarter, month)] = tables
+        return tables
+
+    # Figures for the whole selection, one row per series
+    def selection(self, year='All', quarter='All', month='All'):
+        key = self.filter_index.normalize(year, quarter, month)
+        summary = self.selections.get(key)
+        if summary is None:
+            summary = self._summarize(np.empty((0, len(self.columns))), slice(0, 0))
+        return pd.DataFrame(summary, index=self.columns)
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_store
+from figures import AVAILABLE_VARIABLES
+from rollups import STATS
+
+# Rows of the source CSV in the store before the appends, and after the
+# first of them (the second release adds the rest, crossing a year end)
+BASE_ROWS = -14
+FIRST_RELEASE_ROWS = -5
+
+
+# Sums over different row groupings agree to rounding
+RTOL = 1e-8
+
+# Pairs whose rolling correlation is cached before each append, and the
+# selections whose Spearman matrices are (stale ones are dropped, the rest
+# inherited)
+ROLLING_PAIRS = [("m0", "m2"), ("nfa", "domestic_credit"), ("ncg", "credit_private_sector")]
+SPEARMAN_KEYS = [("All", "All", "All"), (2010, "All", "All"), ("All", "Q1", "All"), ("All", "All", "January")]
+
+
+def close(a, b):
+    np.testing.assert_allclose(np.asarray(a, dtype=float), np.asarray(b, dtype=float),
+                               rtol=RTOL, atol=1e-6, equal_nan=True)
+
+
+def same_frame(a, b):
+    pd.testing.assert_frame_equal(a, b, check_exact=False, rtol=RTOL, atol=1e-6, check_freq=False)
+
+
+# The same history as one fresh store, and as a store built from its first
+# months with two releases appended, opened the way the dashboard does, so
+# each appended version inherits the derived data of the one before,
+# including the cached rolling and Spearman correlations
+@pytest.fixture(scope="module")
+def datasets(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("append")
+    raw = pd.read_csv(data_store.SOURCE_CSV)
+    sources = {}
+    for name, rows in [("base", BASE_ROWS), ("first", FIRST_RELEASE_ROWS), ("second", None)]:
+        sources[name] = str(tmp / f"{name}.csv")
+        raw.iloc[:rows].to_csv(sources[name], index=False)
+
+    fresh_path = str(tmp / "fresh.arrow")
+    data_store.build_store(sources["second"], fresh_path)
+    fresh = data_store.Dataset.open(fresh_path)
+
+    path = str(tmp / "appended.arrow")
+    data_store.build_store(sources["base"], path)
+    shared = data_store.SharedDataset(path)
+    for release in ("first", "second"):
+        dataset = shared.current()
+        dataset.rollups, dataset.indicators
+        for x, y in ROLLING_PAIRS:
+            dataset.pair_stats.rolling_for(("All", "All", "All"), x, y)
+        for key in SPEARMAN_KEYS:
+            dataset.pair_stats.spearman_for(key, "m0", "m2")
+        assert data_store.append_store(sources[release], path) > 0
+    appended = shared.current()
+    assert appended.parent_version == dataset.version
+    # Extended from the parent's, not built afresh on first use
+    assert {"rollups", "indicators", "pair_stats"} <= set(vars(appended))
+    assert len(appended.pair_stats._rolling) == len(ROLLING_PAIRS)
+    assert ("All", "All", "All") not in appended.pair_stats._spearman
+    assert (2010, "All", "All") in appended.pair_stats._spearman
+    return fresh, appended
+
+
+def test_frames_match(datasets):
+    fresh, appended = datasets
+    pd.testing.assert_frame_equal(fresh.frame, appended.frame)
+    assert appended.years == fresh.years
+    assert appended.month_names == fresh.month_names
+
+
+def test_indicators_match(datasets):
+    fresh, appended = datasets
+    same_frame(appended.indicators, fresh.indicators)
+
+
+def test_rollups_match(datasets):
+    fresh, appended = datasets
+    for key in fresh.filter_index.selections():
+        for stat in STATS:
+            same_frame(appended.rollups.yearly(stat, *key), fresh.rollups.yearly(stat, *key))
+        same_frame(appended.rollups.selection(*key), fresh.rollups.selection(*key))
+
+
+def test_kpis_match(datasets):
+    fresh, appended = datasets
+    for key in fresh.filter_index.selections():
+        expected = fresh.kpis(*key)
+        for name, (value, date) in appended.kpis(*key).items():
+            close(value, expected[name][0])
+            assert date == expected[name][1], (name, key)
+
+
+def test_pair_stats_match(datasets):
+    fresh, appended = datasets
+    keys = fresh.filter_index.selections()
+    # Every year, and each quarter and month across all years
+    keys = [key for key in keys if list(key).count('All') >= 2]
+    expected_stats, stats = fresh.pair_stats, appended.pair_stats
+    scale = fresh.frame.abs().max().clip(lower=1)
+    for key in keys:
+        for x in AVAILABLE_VARIABLES:
+            for y in AVAILABLE_VARIABLES:
+                close(stats.pearson_for(key, x, y), expected_stats.pearson_for(key, x, y))
+                slope, intercept = stats.fit_for(key, x, y)
+                expected_slope, expected_intercept = expected_stats.fit_for(key, x, y)
+                close(slope, expected_slope)
+                # The intercept carries the slope's rounding times x, about y's scale
+                np.testing.assert_allclose(intercept, expected_intercept, atol=RTOL * scale[y])
+        close(stats.spearman_for(key, "m0", "m2"), expected_stats.spearman_for(key, "m0", "m2"))
+
+
+def test_cached_correlations_match(datasets):
+    fresh, appended = datasets
+    expected_stats, stats = fresh.pair_stats, appended.pair_stats
+    # Inherited from the parent's cache (or recomputed, for stale selections)
+    for key in SPEARMAN_KEYS:
+        stats.spearman_for(key, "m0", "m2")
+        expected_stats.spearman_for(key, "m0", "m2")
+        close(stats._spearman[key], expected_stats._spearman[key])
+    # Extended over the appended rows
+    for x, y in ROLLING_PAIRS:
+        for key in [("All", "All", "All"), (fresh.years[-1], "All", "All"), ("All", "All", "December")]:
+            pd.testing.assert_series_equal(stats.rolling_for(key, x, y), expected_stats.rolling_for(key, x, y),
+                                           check_exact=False, rtol=RTOL, atol=1e-6, check_freq=False)
+
+
+def test_append_rejects_a_gap(tmp_path):
+    raw = pd.read_csv(data_store.SOURCE_CSV)
+    base, release = str(tmp_path / "base.csv"), str(tmp_path / "release.csv")
+    raw.iloc[:BASE_ROWS].to_csv(base, index=False)
+    # The release skips the month after the store's last one
+    raw.iloc[BASE_ROWS + 1:].to_csv(release, index=False)
+    path = str(tmp_path / "store.arrow")
+    data_store.build_store(base, path)
+    with pytest.raises(ValueError, match="doesn't continue monthly"):
+        data_store.append_store(release, path)
+    assert len(data_store.Dataset.open(path).frame) == len(raw) + BASE_ROWS
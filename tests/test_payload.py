@@ -0,0 +1,10 @@
+import figures
+import payload
+
+
+# The report builds every chart from the inputs the dashboard gives it, so
+# a chart whose inputs change without the report following fails here
+def test_report_covers_every_chart(capsys):
+    payload.report()
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[0] for line in lines] == list(figures.CHARTS) + ["total"]